@@ -2,6 +2,8 @@ import os
 import logging
 from datetime import datetime
 
+from image_validation import ImageValidator, SUPPORTED_FORMATS
+
 
 class AppUtils:
     @staticmethod
@@ -29,21 +31,8 @@ class AppUtils:
     
     @staticmethod
     def validate_image_path(image_path):
-        """Validate if the image path exists and is readable."""
-        if not image_path:
-            return False, "No image path provided"
-        
-        if not os.path.exists(image_path):
-            return False, "File does not exist"
-        
-        # Check file extension
-        _, ext = os.path.splitext(image_path.lower())
-        supported_formats = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff']
-        
-        if ext not in supported_formats:
-            return False, f"Unsupported format. Supported: {supported_formats}"
-        
-        return True, "Valid image"
+        """Validate if the image path exists and is a readable image (header only)."""
+        return ImageValidator(AppUtils.get_supported_image_formats()).validate(image_path)
     
     @staticmethod
     def get_timestamp():
@@ -121,7 +110,7 @@ class AppUtils:
     @staticmethod
     def get_supported_image_formats():
         """Get list of supported image formats."""
-        return ['.jpg', '.jpeg', '.png', '.bmp', '.tiff']
+        return list(SUPPORTED_FORMATS)
     
     @staticmethod
     def get_file_dialog_filters():
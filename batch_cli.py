@@ -0,0 +1,492 @@
+"""Headless batch processing for render servers.
+
+Runs visible/invisible watermarking, watermark extraction and blending over
+directories or glob patterns in a process pool. Never imports tkinter.
+
+Examples:
+    python batch_cli.py visible "images/*.jpg" --watermark logo.png --opacity 40
+    python batch_cli.py invisible photos/ --watermark logo.png --alpha 0.1 --workers 8
+    python batch_cli.py extract suspects/ --original photo.jpg --method fourier
+    python batch_cli.py blend images/ --with overlay.jpg --direction diagonal
+"""
+import argparse
+import glob
+import hashlib
+import logging
+import os
+import sys
+import time
+from collections import Counter
+
+import cv2
+
+from watermarking import Watermarking, PreparedWatermark, FourierExtractor, FOURIER_ENGINES
+from blending import ImageBlending, MULTIBAND_LEVELS
+from app_utils import AppUtils
+from job_scheduler import JobScheduler
+from result_cache import write_image
+from image_writer import CodecSettings, CODEC_EXTENSIONS
+from pipeline import Pipeline, Stage
+from shared_memory_pool import SharedMemoryPool, SharedArray
+from thread_budget import ThreadBudget, autotune, AUTOTUNE_SAMPLES
+from file_manager import FileManager
+from result_index import DEFAULT_INDEX_NAME
+
+
+OPERATIONS = ('visible', 'invisible', 'extract', 'blend')
+
+DEFAULT_OUTPUT_DIRS = {
+    'visible': 'watermarked_images',
+    'invisible': 'watermarked_images',
+    'extract': 'results',
+    'blend': 'blended_images'
+}
+
+# Option naming the image every input of an operation is combined with
+SHARED_INPUTS = {
+    'invisible': 'watermark',
+    'extract': 'original',
+    'blend': 'second'
+}
+
+# Per-process state, created once by _init_worker
+_worker = {}
+
+
+def expand_inputs(patterns):
+    """Expand files, directories and glob patterns into a sorted list of image paths."""
+    supported_formats = AppUtils.get_supported_image_formats()
+    paths = []
+
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            candidates = [os.path.join(pattern, name) for name in os.listdir(pattern)]
+        else:
+            candidates = glob.glob(pattern)
+
+        for path in candidates:
+            _, ext = os.path.splitext(path.lower())
+            if os.path.isfile(path) and ext in supported_formats:
+                paths.append(path)
+
+    # De-duplicate while keeping a stable order
+    return sorted(set(paths))
+
+
+def _init_worker(options):
+    # Workers and OpenCV's own threads share one core budget, so together
+    # they never oversubscribe the machine
+    budget = options.get('thread_budget')
+    if budget is not None:
+        budget.apply()
+    else:
+        cv2.setNumThreads(1)
+
+    _worker['options'] = options
+    _worker['watermarking'] = Watermarking(fourier_engine=options['fourier_engine'],
+                                           tile_size=options['tile_size'],
+                                           draft_scale=options['draft_scale'])
+    _worker['blending'] = ImageBlending(tile_size=options['tile_size'],
+                                        draft_scale=options['draft_scale'])
+    _worker['extractor'] = None
+    _worker['codec'] = codec_from_options(options)
+    _worker['images'] = {}
+
+
+def _init_shared_worker(options, shared_images):
+    _init_worker(options)
+    # Mapped for the worker's lifetime instead of decoded once per process
+    _worker['shared'] = shared_images
+    _worker['images'] = {option: shared.array for option, shared in shared_images.items()}
+
+
+def _read(path):
+    img = cv2.imread(path, _worker['watermarking'].read_flags)
+    if img is None:
+        raise ValueError(f"Could not load image: {path}")
+    return img
+
+
+def _shared_image(option):
+    # The second image of an operation, decoded once per process
+    images = _worker['images']
+    if option not in images:
+        images[option] = _read(_worker['options'][option])
+    return images[option]
+
+
+def _process_file(operation, input_path, output_path):
+    return _write(_compute(operation, _read(input_path)), output_path)
+
+
+def _compute(operation, img):
+    options = _worker['options']
+    watermarking = _worker['watermarking']
+
+    if operation == 'visible':
+        # PreparedWatermark shares one edge map per output size within this process
+        return watermarking.visible_watermark_array(
+            img, PreparedWatermark(options['watermark']), options['opacity'])
+    elif operation == 'invisible':
+        return watermarking.invisible_watermark_array(img, _shared_image('watermark'), options['alpha'])
+    elif operation == 'extract':
+        if options['method'] == 'fourier':
+            if _worker['extractor'] is None:
+                _worker['extractor'] = FourierExtractor(options['original'], watermarking,
+                                                        _shared_image('original'))
+            return _worker['extractor'].extract_array(img)
+        return watermarking.extract_watermark_array(_shared_image('original'), img, options['method'])
+    elif operation == 'blend':
+        blending = _worker['blending']
+        if options['mode'] == 'multiband':
+            return blending.multiband_blend_array(
+                img, _shared_image('second'), options['direction'], options['alpha'], options['levels'])
+        return blending.blend_images_array(
+            img, _shared_image('second'), options['direction'], options['alpha'])
+    raise ValueError(f"Unknown operation: {operation}")
+
+
+def _result_shape(operation, img):
+    # Output block size for a compute step in another process
+    options = _worker['options']
+    if operation == 'extract' and options['method'] == 'edge':
+        return img.shape[:2]
+    if operation == 'blend':
+        return _worker['blending'].target_size(img, _shared_image('second')) + (3,)
+    return img.shape
+
+
+def _write(result, output_path):
+    return write_image(output_path, result, _worker['codec'].imwrite_params(output_path))
+
+
+def _time_job(job):
+    # Autotune workload: a batch job without the write, returning no pixels
+    operation, input_path = job
+    return _compute(operation, _read(input_path)).shape
+
+
+def _run_job(job):
+    operation, input_path, output_path = job
+    try:
+        return input_path, _process_file(operation, input_path, output_path), None
+    except Exception as e:
+        return input_path, None, str(e)
+
+
+def codec_from_options(options):
+    return CodecSettings(options.get('format', 'jpg'), quality=options.get('quality'),
+                         optimize=options.get('optimize', False),
+                         progressive=options.get('progressive', False),
+                         png_compression=options.get('png_compression'),
+                         lossless=options.get('lossless', False))
+
+
+def output_path_for(operation, input_path, output_dir, ext='.jpg', disambiguate=False):
+    """Output name derived from the input name.
+
+    disambiguate adds a short hash of the input path, for inputs whose names
+    only differ by directory or extension (x/a.png and y/a.jpg).
+    """
+    name = os.path.splitext(os.path.basename(input_path))[0]
+    if disambiguate:
+        digest = hashlib.blake2b(os.path.abspath(input_path).encode('utf-8'), digest_size=4).hexdigest()
+        name = f"{name}_{digest}"
+    return os.path.join(output_dir, f"{name}_{operation}{ext}")
+
+
+def output_paths_for(operation, input_paths, output_dir, ext='.jpg'):
+    """Output paths for a batch; no two inputs ever share an output."""
+    stems = Counter(os.path.splitext(os.path.basename(path))[0].lower() for path in input_paths)
+    return [output_path_for(operation, path, output_dir, ext,
+                            disambiguate=stems[os.path.splitext(os.path.basename(path))[0].lower()] > 1)
+            for path in input_paths]
+
+
+def run_batch(operation, input_paths, options, output_dir, workers=None, progress=print):
+    """Run one operation over input_paths; returns (succeeded, failed) lists."""
+    os.makedirs(output_dir, exist_ok=True)
+    ext = codec_from_options(options).extension
+    jobs = [(operation, path, output_path)
+            for path, output_path in zip(input_paths, output_paths_for(operation, input_paths, output_dir, ext))]
+
+    succeeded = []
+    failed = []
+    total = len(jobs)
+    done = [0]
+
+    def job_finished(result):
+        input_path, result_path, error = result
+        done[0] += 1
+        if error is None:
+            succeeded.append((input_path, result_path))
+            progress(f"[{done[0]}/{total}] OK     {input_path} -> {result_path}")
+        else:
+            failed.append((input_path, error))
+            progress(f"[{done[0]}/{total}] FAILED {input_path}: {error}")
+
+    def job_failed(input_path):
+        # The worker itself failed (e.g. it crashed and broke the pool)
+        return lambda error: job_finished((input_path, None, error))
+
+    # Same scheduler as the GUI, backed by processes; the bounded queue keeps
+    # only a few jobs in flight beyond the running ones
+    workers = workers or os.cpu_count()
+    scheduler = JobScheduler(max_workers=workers, max_queue=workers * 2, use_processes=True,
+                             initializer=_init_worker, initargs=(options,))
+    try:
+        for job in jobs:
+            try:
+                scheduler.submit(_run_job, job, on_success=job_finished, on_error=job_failed(job[1]),
+                                 block=True)
+            except Exception as e:
+                # A broken pool refuses further submits
+                job_finished((job[1], None, str(e) or type(e).__name__))
+        scheduler.wait()
+    finally:
+        scheduler.shutdown()
+
+    # Every input must be reported, whatever happened to its job
+    reported = {input_path for input_path, _ in succeeded + failed}
+    for _, input_path, _ in jobs:
+        if input_path not in reported:
+            job_finished((input_path, None, "Job did not report a result"))
+
+    return succeeded, failed
+
+
+def run_stream(operation, input_paths, options, output_dir, compute_workers=None, decode_workers=2,
+               encode_workers=2, max_in_flight=None, ordered=False, processes=False, progress=print):
+    """Like run_batch, but with decode, compute and encode overlapping.
+
+    Each stage has its own thread pool and at most max_in_flight images are
+    held in memory. With processes=True the compute stage runs in a
+    SharedMemoryPool: decoded images and results stay in shared memory and
+    workers get only their handles. Returns (succeeded, failed) lists, in
+    input order if ordered.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    ext = codec_from_options(options).extension
+    jobs = list(zip(input_paths, output_paths_for(operation, input_paths, output_dir, ext)))
+    compute_workers = compute_workers or os.cpu_count()
+
+    # Threads of this process share the per-process state of a pool worker
+    _init_worker(options)
+
+    pool = None
+    shared_inputs = {}
+    if processes:
+        shared_inputs = _share_inputs(operation)
+        pool = SharedMemoryPool(max_workers=compute_workers, initializer=_init_shared_worker,
+                                initargs=(options, shared_inputs))
+        stages = _shared_stages(operation, pool, compute_workers, decode_workers, encode_workers)
+    else:
+        stages = [
+            Stage('decode', lambda job: (_read(job[0]), job[1]), decode_workers),
+            Stage('compute', lambda decoded: (_compute(operation, decoded[0]), decoded[1]), compute_workers),
+            Stage('encode', lambda computed: _write(*computed), encode_workers)
+        ]
+
+    succeeded = []
+    failed = []
+    total = len(jobs)
+    try:
+        pipeline = Pipeline(stages, max_in_flight=max_in_flight, ordered=ordered)
+        for done, (job, result_path, error) in enumerate(pipeline.run(jobs), 1):
+            input_path = job[0]
+            if error is None:
+                succeeded.append((input_path, result_path))
+                progress(f"[{done}/{total}] OK     {input_path} -> {result_path}")
+            else:
+                failed.append((input_path, str(error)))
+                progress(f"[{done}/{total}] FAILED {input_path}: {error}")
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        for shared in shared_inputs.values():
+            shared.unlink()
+
+    return succeeded, failed
+
+
+def _share_inputs(operation):
+    # Decoded once here and mapped by every worker
+    option = SHARED_INPUTS.get(operation)
+    if option is None:
+        return {}
+    return {option: SharedArray.from_array(_shared_image(option))}
+
+
+def _shared_stages(operation, pool, compute_workers, decode_workers, encode_workers):
+    def decode(job):
+        return pool.share(_read(job[0])), job[1]
+
+    def compute(decoded):
+        shared, output_path = decoded
+        try:
+            out_shape = _result_shape(operation, shared.array)
+            # Each compute thread waits on one worker process
+            return pool.submit(_compute, operation, shared, out_shape=out_shape).result(), output_path
+        finally:
+            pool.release(shared)
+
+    def encode(computed):
+        shared, output_path = computed
+        try:
+            return _write(shared.array, output_path)
+        finally:
+            pool.release(shared)
+
+    return [
+        Stage('decode', decode, decode_workers),
+        Stage('compute', compute, compute_workers),
+        Stage('encode', encode, encode_workers)
+    ]
+
+
+def record_outputs(result_paths):
+    """Add batch outputs to the application's result index, when run from its directory.
+
+    Workers write in other processes, so the GUI process never sees these writes.
+    """
+    if not result_paths or not os.path.exists(os.path.join('logs', DEFAULT_INDEX_NAME)):
+        return 0
+    file_manager = FileManager(reconcile=False)
+    try:
+        return sum(1 for path in result_paths if file_manager.record_result(path))
+    finally:
+        file_manager.close()
+
+
+def autotune_budget(operation, input_paths, options, cores=None, processes=True, progress=print):
+    """ThreadBudget whose worker/OpenCV split runs operation fastest on the first inputs.
+
+    processes times worker processes, as run_batch uses; otherwise threads of
+    this process, as run_stream uses without --processes.
+    """
+    sample_paths = input_paths[:AUTOTUNE_SAMPLES]
+    progress(f"Autotuning on {len(sample_paths)} input(s) with worker "
+             f"{'processes' if processes else 'threads'}...")
+    if processes:
+        budget, timings = autotune(_time_job, [(operation, path) for path in sample_paths], cores,
+                                   use_processes=True, initializer=_init_worker, initargs=(options,))
+    else:
+        _init_worker(options)
+        samples = [_read(path) for path in sample_paths]
+        budget, timings = autotune(lambda img: _compute(operation, img), samples, cores)
+    for (workers, opencv_threads), rate in sorted(timings.items()):
+        progress(f"  {workers:3d} workers x {opencv_threads:2d} OpenCV threads: {rate:.2f} images/s")
+    return budget
+
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Headless batch image watermarking and blending")
+    parser.add_argument('--workers', type=positive_int, default=None,
+                        help="Number of worker processes (default: one per core of the budget; "
+                             "more than the budget is allowed but warned about)")
+    parser.add_argument('--cores', type=positive_int, default=None,
+                        help="Core budget shared by workers and OpenCV threads (default: all available)")
+    parser.add_argument('--opencv-threads', type=positive_int, default=None,
+                        help="OpenCV threads per worker (default: cores / workers)")
+    parser.add_argument('--autotune', action='store_true',
+                        help="Benchmark worker/OpenCV thread splits on the first inputs and use the fastest")
+    parser.add_argument('--output-dir', help="Directory for results (default depends on operation)")
+    parser.add_argument('--tile-size', type=positive_int, default=None,
+                        help="Process very large images in tiles of this many pixels")
+    parser.add_argument('--fourier-engine', choices=FOURIER_ENGINES, default='auto')
+    parser.add_argument('--draft-scale', type=int, choices=(1, 2, 4, 8), default=1,
+                        help="Decode inputs at 1/N resolution for quick drafts")
+    parser.add_argument('--format', choices=sorted(CODEC_EXTENSIONS), default='jpg', help="Output format")
+    parser.add_argument('--quality', type=int, default=None, help="JPEG/WebP quality 1-100")
+    parser.add_argument('--optimize', action='store_true', help="Optimized JPEG Huffman tables")
+    parser.add_argument('--progressive', action='store_true', help="Progressive JPEG")
+    parser.add_argument('--png-compression', type=int, choices=range(10), default=None,
+                        metavar='0-9', help="PNG compression level")
+    parser.add_argument('--lossless', action='store_true', help="Lossless WebP")
+    parser.add_argument('--stream', action='store_true',
+                        help="Run in one process with overlapping decode/compute/encode thread pools "
+                             "(--workers sets the compute threads)")
+    parser.add_argument('--decode-workers', type=positive_int, default=2, help="Decode threads with --stream")
+    parser.add_argument('--encode-workers', type=positive_int, default=2, help="Encode threads with --stream")
+    parser.add_argument('--max-in-flight', type=positive_int, default=None,
+                        help="Images held in memory at once with --stream (default: 2x total threads)")
+    parser.add_argument('--ordered', action='store_true', help="Report results in input order with --stream")
+    parser.add_argument('--processes', action='store_true',
+                        help="With --stream, compute in worker processes that exchange images "
+                             "through shared memory")
+
+    subparsers = parser.add_subparsers(dest='operation', required=True)
+
+    visible = subparsers.add_parser('visible', help="Visible (edge) watermarking")
+    visible.add_argument('inputs', nargs='+', help="Image files, directories or glob patterns")
+    visible.add_argument('--watermark', required=True)
+    visible.add_argument('--opacity', type=int, default=50, help="Edge opacity 0-100")
+
+    invisible = subparsers.add_parser('invisible', help="Invisible (frequency domain) watermarking")
+    invisible.add_argument('inputs', nargs='+', help="Image files, directories or glob patterns")
+    invisible.add_argument('--watermark', required=True)
+    invisible.add_argument('--alpha', type=float, default=0.1, help="Watermark strength 0.0-1.0")
+
+    extract = subparsers.add_parser('extract', help="Extract watermarks against one original")
+    extract.add_argument('inputs', nargs='+', help="Watermarked files, directories or glob patterns")
+    extract.add_argument('--original', required=True)
+    extract.add_argument('--method', choices=('fourier', 'edge'), default='fourier')
+
+    blend = subparsers.add_parser('blend', help="Blend every input with one second image")
+    blend.add_argument('inputs', nargs='+', help="Image files, directories or glob patterns")
+    blend.add_argument('--with', dest='second', required=True, help="Second image to blend with")
+    blend.add_argument('--direction', choices=('horizontal', 'vertical', 'diagonal'), default='horizontal')
+    blend.add_argument('--alpha', type=float, default=0.5, help="Blend strength 0.0-1.0")
+    blend.add_argument('--mode', choices=('gradient', 'multiband'), default='gradient')
+    blend.add_argument('--levels', type=int, default=MULTIBAND_LEVELS)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    input_paths = expand_inputs(args.inputs)
+    if not input_paths:
+        print("No input images found", file=sys.stderr)
+        return 2
+
+    options = {key: value for key, value in vars(args).items()
+               if key not in ('inputs', 'workers', 'output_dir', 'cores', 'opencv_threads', 'autotune')}
+    output_dir = args.output_dir or DEFAULT_OUTPUT_DIRS[args.operation]
+
+    if args.autotune:
+        budget = autotune_budget(args.operation, input_paths, options, args.cores,
+                                 processes=not args.stream or args.processes)
+    else:
+        budget = ThreadBudget(args.cores, args.workers, args.opencv_threads)
+    options['thread_budget'] = budget
+    print(f"Thread budget: {budget}")
+
+    start = time.time()
+    if args.stream:
+        succeeded, failed = run_stream(args.operation, input_paths, options, output_dir, budget.workers,
+                                       args.decode_workers, args.encode_workers, args.max_in_flight,
+                                       args.ordered, args.processes)
+    else:
+        succeeded, failed = run_batch(args.operation, input_paths, options, output_dir, budget.workers)
+    elapsed = time.time() - start
+    record_outputs([result_path for _, result_path in succeeded])
+
+    print(f"\n{len(succeeded)} succeeded, {len(failed)} failed in {elapsed:.1f}s")
+    for input_path, error in failed:
+        print(f"  {input_path}: {error}", file=sys.stderr)
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
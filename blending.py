@@ -1,155 +1,323 @@
 import cv2
 import numpy as np
 from datetime import datetime
-import os
+from functools import lru_cache
 
+from tiling import TileGrid, resize_region
+from image_cache import imread, draft_read_flags
+from result_cache import write_image
+from image_writer import CachedResultsMixin
+from job_scheduler import JobCancelled
 
-class ImageBlending:
+
+# Pixels per row strip in the blend kernel; bounds the float32 weight buffers
+BLEND_STRIP_PIXELS = 1 << 18
+
+# Default number of Laplacian pyramid levels for multiband blending
+MULTIBAND_LEVELS = 5
+
+
+def _ramp(length):
+    # 0..1 over length samples, as float64 so the float32 result matches i / (length - 1)
+    return np.arange(length, dtype=np.float64) / max(length - 1, 1)
+
+
+def _readonly_profiles(rows, cols, alpha):
+    rows = (rows.astype(np.float32) * np.float32(alpha)).reshape(-1, 1)
+    cols = (cols.astype(np.float32) * np.float32(alpha)).reshape(1, -1)
     
-    def __init__(self):
-        self.supported_formats = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff']
+    # Cached and shared between blends, so they must never be modified in place
+    rows.setflags(write=False)
+    cols.setflags(write=False)
+    return rows, cols
+
+
+@lru_cache(maxsize=64)
+def _gradient_profiles(height, width, direction, alpha):
+    rows = np.zeros(height)
+    cols = np.zeros(width)
     
-    def create_gradient_mask(self, height, width, direction='horizontal', alpha=0.5):
+    if direction == 'horizontal':
+        # Left to right gradient
+        cols = _ramp(width)
+    elif direction == 'vertical':
+        # Top to bottom gradient
+        rows = _ramp(height)
+    elif direction == 'diagonal':
+        # Diagonal gradient (top-left to bottom-right): (i + j) / (height + width - 2)
+        denominator = max(height + width - 2, 1)
+        rows = np.arange(height, dtype=np.float64) / denominator
+        cols = np.arange(width, dtype=np.float64) / denominator
+    
+    return _readonly_profiles(rows, cols, alpha)
+
 
-        mask = np.zeros((height, width), dtype=np.float32)
+@lru_cache(maxsize=64)
+def _advanced_profiles(height, width, blend_type, alpha):
+    t = _ramp(width)
+    cols = np.zeros(width)
+    
+    if blend_type == 'linear':
+        # Linear gradient (same as basic horizontal)
+        cols = t
+    elif blend_type == 'sigmoid':
+        # Sigmoid gradient for smoother transitions, x scaled to [-5, 5]
+        cols = 1 / (1 + np.exp(-(t * 10 - 5)))
+    elif blend_type == 'cosine':
+        # Cosine gradient for smooth transitions
+        cols = (1 - np.cos(np.pi * t)) / 2
+    
+    return _readonly_profiles(np.zeros(height), cols, alpha)
+
+
+class ImageBlending(CachedResultsMixin):
+    
+    def __init__(self, tile_size=None, draft_scale=1, cache_results=True, codecs=None, writer=None):
+        super().__init__(cache_results, codecs, writer)
         
-        if direction == 'horizontal':
-            # Left to right gradient
-            for i in range(width):
-                mask[:, i] = i / (width - 1)
-                
-        elif direction == 'vertical':
-            # Top to bottom gradient
-            for i in range(height):
-                mask[i, :] = i / (height - 1)
-                
-        elif direction == 'diagonal':
-            # Diagonal gradient (top-left to bottom-right)
-            for i in range(height):
-                for j in range(width):
-                    mask[i, j] = (i + j) / (height + width - 2)
+        # Tiled mode resizes, masks and blends one tile at a time
+        self.tile_size = tile_size
         
-        # Apply alpha scaling
-        mask = mask * alpha
+        # Draft mode decodes inputs at 1/2, 1/4 or 1/8 scale for previews and tuning
+        self.draft_scale = draft_scale
+        self.read_flags = draft_read_flags(draft_scale)
+    
+    def create_gradient_mask(self, height, width, direction='horizontal', alpha=0.5):
+
+        rows, cols = self.gradient_mask_profiles(height, width, direction, alpha)
         
-        return mask
+        # Broadcast the two 1-D profiles into a full (height, width) mask
+        return rows + cols
+    
+    def gradient_mask_profiles(self, height, width, direction='horizontal', alpha=0.5):
+        """Return cached (height, 1) and (1, width) profiles whose sum is the gradient mask."""
+        return _gradient_profiles(height, width, direction, float(alpha))
     
-    def blend_images(self, image1_path, image2_path, direction='horizontal', alpha=0.5, output_path=None):
+    def blend_images(self, image1_path, image2_path, direction='horizontal', alpha=0.5, output_path=None,
+                     on_result=None):
 
         try:
+            default_prefix = f"blended_images/blended_{direction}"
+            key = self.result_key('gradient', [image1_path, image2_path], direction=direction, alpha=alpha)
+            cached_path = self.cached_result(output_path, default_prefix, key, 'gradient')
+            if cached_path:
+                return cached_path
+            
             # Load images
-            img1 = cv2.imread(image1_path)
-            img2 = cv2.imread(image2_path)
+            img1 = imread(image1_path, self.read_flags)
+            img2 = imread(image2_path, self.read_flags)
             
             if img1 is None or img2 is None:
                 raise ValueError("Could not load one or both images")
             
-            # Resize images to the same dimensions (use the smaller dimensions)
-            h1, w1 = img1.shape[:2]
-            h2, w2 = img2.shape[:2]
-            
-            target_height = min(h1, h2)
-            target_width = min(w1, w2)
+            blended = self.blend_images_array(img1, img2, direction, alpha)
             
-            img1_resized = cv2.resize(img1, (target_width, target_height))
-            img2_resized = cv2.resize(img2, (target_width, target_height))
-            
-            # Create gradient mask
-            mask = self.create_gradient_mask(target_height, target_width, direction, alpha)
-            
-            # Convert mask to 3-channel
-            mask_3channel = cv2.cvtColor(mask, cv2.COLOR_GRAY2BGR)
-            
-            # Apply blending
-            # For each pixel: result = img1 * (1 - mask) + img2 * mask
-            blended = img1_resized.astype(np.float32) * (1 - mask_3channel) + img2_resized.astype(np.float32) * mask_3channel
-            
-            # Convert back to uint8
-            blended = np.clip(blended, 0, 255).astype(np.uint8)
-            
-            # Generate output path if not provided
-            if output_path is None:
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                output_path = f"blended_images/blended_{direction}_{timestamp}.jpg"
-            
-            # Save the result
-            cv2.imwrite(output_path, blended)
-            
-            return output_path
+            return self.save_result(blended, output_path, default_prefix, on_result, key, 'gradient')
             
+        except JobCancelled:
+            # Raised by on_result for a cancelled job, which is not an error
+            raise
         except Exception as e:
             print(f"Error in image blending: {str(e)}")
             return None
     
-    def advanced_blend(self, image1_path, image2_path, blend_type='linear', alpha=0.5, output_path=None):
+    def blend_images_array(self, img1, img2, direction='horizontal', alpha=0.5):
+        """In-memory gradient blending of two BGR uint8 arrays."""
+        target_height, target_width = self.target_size(img1, img2)
+        
+        # Create gradient mask
+        rows, cols = self.gradient_mask_profiles(target_height, target_width, direction, alpha)
+        
+        return self.blend_with_profiles(img1, img2, rows, cols)
+    
+    def advanced_blend(self, image1_path, image2_path, blend_type='linear', alpha=0.5, output_path=None,
+                       on_result=None):
 
         try:
+            default_prefix = f"blended_images/advanced_blend_{blend_type}"
+            key = self.result_key('advanced', [image1_path, image2_path], blend_type=blend_type, alpha=alpha)
+            cached_path = self.cached_result(output_path, default_prefix, key, 'advanced')
+            if cached_path:
+                return cached_path
+            
             # Load images
-            img1 = cv2.imread(image1_path)
-            img2 = cv2.imread(image2_path)
+            img1 = imread(image1_path, self.read_flags)
+            img2 = imread(image2_path, self.read_flags)
             
             if img1 is None or img2 is None:
                 raise ValueError("Could not load one or both images")
             
-            # Resize images to the same dimensions
-            h1, w1 = img1.shape[:2]
-            h2, w2 = img2.shape[:2]
-            
-            target_height = min(h1, h2)
-            target_width = min(w1, w2)
-            
-            img1_resized = cv2.resize(img1, (target_width, target_height))
-            img2_resized = cv2.resize(img2, (target_width, target_height))
+            blended = self.advanced_blend_array(img1, img2, blend_type, alpha)
             
-            # Create advanced gradient mask
-            mask = self._create_advanced_mask(target_height, target_width, blend_type, alpha)
+            return self.save_result(blended, output_path, default_prefix, on_result, key, 'advanced')
             
-            # Convert mask to 3-channel
-            mask_3channel = cv2.cvtColor(mask, cv2.COLOR_GRAY2BGR)
-            
-            # Apply blending
-            blended = img1_resized.astype(np.float32) * (1 - mask_3channel) + img2_resized.astype(np.float32) * mask_3channel
+        except JobCancelled:
+            raise
+        except Exception as e:
+            print(f"Error in advanced blending: {str(e)}")
+            return None
+    
+    def advanced_blend_array(self, img1, img2, blend_type='linear', alpha=0.5):
+        """In-memory advanced blending of two BGR uint8 arrays."""
+        target_height, target_width = self.target_size(img1, img2)
+        
+        # Create advanced gradient mask
+        rows, cols = _advanced_profiles(target_height, target_width, blend_type, float(alpha))
+        
+        return self.blend_with_profiles(img1, img2, rows, cols)
+    
+    def multiband_blend(self, image1_path, image2_path, direction='horizontal', alpha=0.5,
+                        levels=MULTIBAND_LEVELS, output_path=None, on_result=None):
+
+        try:
+            default_prefix = f"blended_images/multiband_{direction}"
+            key = self.result_key('multiband', [image1_path, image2_path], direction=direction, alpha=alpha, levels=levels)
+            cached_path = self.cached_result(output_path, default_prefix, key, 'multiband')
+            if cached_path:
+                return cached_path
             
-            # Convert back to uint8
-            blended = np.clip(blended, 0, 255).astype(np.uint8)
+            # Load images
+            img1 = imread(image1_path, self.read_flags)
+            img2 = imread(image2_path, self.read_flags)
             
-            # Generate output path if not provided
-            if output_path is None:
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                output_path = f"blended_images/advanced_blend_{blend_type}_{timestamp}.jpg"
+            if img1 is None or img2 is None:
+                raise ValueError("Could not load one or both images")
             
-            # Save the result
-            cv2.imwrite(output_path, blended)
+            blended = self.multiband_blend_array(img1, img2, direction, alpha, levels)
             
-            return output_path
+            return self.save_result(blended, output_path, default_prefix, on_result, key, 'multiband')
             
+        except JobCancelled:
+            raise
         except Exception as e:
-            print(f"Error in advanced blending: {str(e)}")
+            print(f"Error in multiband blending: {str(e)}")
             return None
     
+    def multiband_blend_array(self, img1, img2, direction='horizontal', alpha=0.5,
+                              levels=MULTIBAND_LEVELS, preview_level=0):
+        """Laplacian-pyramid blend weighted by the gradient mask.
+        
+        With preview_level > 0 only the pyramid levels from preview_level down are
+        built, giving a draft at 1 / 2**preview_level of the full resolution;
+        inputs and mask are then never created at full resolution.
+        """
+        if self.tile_size:
+            raise ValueError("Multiband blending cannot run in tiled mode")
+        
+        target_height, target_width = self.target_size(img1, img2)
+        
+        # The coarsest level must keep at least one pixel
+        levels = max(0, min(levels, int(np.log2(max(min(target_height, target_width), 1)))))
+        preview_level = max(0, min(preview_level, levels))
+        
+        # A draft starts at the size of its first level (pyrDown rounds up): the
+        # uint8 inputs are area-resized straight there and the mask is built there
+        height, width = target_height, target_width
+        for _ in range(preview_level):
+            height, width = (height + 1) // 2, (width + 1) // 2
+        interpolation = cv2.INTER_AREA if preview_level else cv2.INTER_LINEAR
+        
+        img1 = self.resize_to(img1, width, height, interpolation)
+        img2 = self.resize_to(img2, width, height, interpolation)
+        mask = self.create_gradient_mask(height, width, direction, alpha)
+        
+        return self.laplacian_blend(img1, img2, mask, levels - preview_level)
+    
+    def laplacian_blend(self, img1, img2, mask, levels):
+        """Blend two same-sized images band by band over a levels-deep Laplacian pyramid.
+        
+        Peak working memory is about four float32 copies of one input, 16 bytes
+        per pixel and channel: both float inputs, an upsampled level and the
+        blended pyramid (about 4/3 of one).
+        """
+        gauss1 = img1.astype(np.float32)
+        gauss2 = img2.astype(np.float32)
+        
+        # Only the blended Laplacian pyramid is kept, not the pyramids of both inputs
+        blended_laplacians = []
+        for _ in range(levels):
+            size = (gauss1.shape[1], gauss1.shape[0])
+            down1 = cv2.pyrDown(gauss1)
+            down2 = cv2.pyrDown(gauss2)
+            
+            # Laplacian level = Gaussian level - upsampled next level
+            gauss1 -= cv2.pyrUp(down1, dstsize=size)
+            gauss2 -= cv2.pyrUp(down2, dstsize=size)
+            blended_laplacians.append(cv2.blendLinear(gauss1, gauss2, 1 - mask, mask))
+            
+            gauss1, gauss2 = down1, down2
+            mask = cv2.pyrDown(mask)
+        
+        # Blend the coarsest Gaussian level, then collapse the pyramid
+        blended = cv2.blendLinear(gauss1, gauss2, 1 - mask, mask)
+        for laplacian in reversed(blended_laplacians):
+            blended = cv2.pyrUp(blended, dstsize=(laplacian.shape[1], laplacian.shape[0]))
+            blended += laplacian
+        
+        # Convert back to uint8
+        return np.clip(blended, 0, 255).astype(np.uint8)
+    
+    def target_size(self, img1, img2):
+        """(height, width) both inputs are resized to before blending."""
+        # Resize images to the same dimensions (use the smaller dimensions)
+        h1, w1 = img1.shape[:2]
+        h2, w2 = img2.shape[:2]
+        
+        return min(h1, h2), min(w1, w2)
+    
+    def blend_with_profiles(self, img1, img2, rows, cols):
+        """Blend with the mask rows + cols, resizing both inputs to its size."""
+        if self.tile_size:
+            return self._blend_tiled(img1, img2, rows, cols)
+        
+        target_height, target_width = rows.shape[0], cols.shape[1]
+        img1_resized = self.resize_to(img1, target_width, target_height)
+        img2_resized = self.resize_to(img2, target_width, target_height)
+        
+        blended = np.empty((target_height, target_width, 3), dtype=np.uint8)
+        self._blend_kernel(img1_resized, img2_resized, rows, cols, blended)
+        return blended
+    
+    def resize_to(self, img, width, height, interpolation=cv2.INTER_LINEAR):
+        """img at width x height; img itself when it already has that size."""
+        # Skip the copy cv2.resize makes when the size already matches
+        if img.shape[:2] == (height, width):
+            return img
+        return cv2.resize(img, (width, height), interpolation=interpolation)
+    
+    def _blend_kernel(self, img1, img2, rows, cols, out):
+        # For each pixel: out = img1 * (1 - mask) + img2 * mask, with mask = rows + cols.
+        # Row strips keep the float32 weights small instead of full-size 3-channel copies.
+        height, width = out.shape[:2]
+        strip_height = max(1, BLEND_STRIP_PIXELS // width)
+        
+        for y0 in range(0, height, strip_height):
+            y1 = min(y0 + strip_height, height)
+            weights2 = np.ascontiguousarray(np.broadcast_to(rows[y0:y1] + cols, (y1 - y0, width)))
+            weights1 = 1 - weights2
+            out[y0:y1] = cv2.blendLinear(np.ascontiguousarray(img1[y0:y1]),
+                                         np.ascontiguousarray(img2[y0:y1]),
+                                         weights1, weights2)
+    
+    def output_settings(self):
+        # Tiling and draft decoding change the output, so they are part of the result key
+        return {'tile_size': self.tile_size, 'draft_scale': self.draft_scale}
+    
     def _create_advanced_mask(self, height, width, blend_type, alpha):
-        mask = np.zeros((height, width), dtype=np.float32)
-        
-        if blend_type == 'linear':
-            # Linear gradient (same as basic horizontal)
-            for i in range(width):
-                mask[:, i] = i / (width - 1)
-                
-        elif blend_type == 'sigmoid':
-            # Sigmoid gradient for smoother transitions
-            for i in range(width):
-                x = (i / (width - 1)) * 10 - 5  # Scale to [-5, 5]
-                mask[:, i] = 1 / (1 + np.exp(-x))
-                
-        elif blend_type == 'cosine':
-            # Cosine gradient for smooth transitions
-            for i in range(width):
-                mask[:, i] = (1 - np.cos(np.pi * i / (width - 1))) / 2
-        
-        # Apply alpha scaling
-        mask = mask * alpha
-        
-        return mask
+        rows, cols = _advanced_profiles(height, width, blend_type, float(alpha))
+        return rows + cols
+    
+    def _blend_tiled(self, img1, img2, rows, cols):
+        target_height, target_width = rows.shape[0], cols.shape[1]
+        blended = np.empty((target_height, target_width, 3), dtype=np.uint8)
+        
+        for tile in TileGrid(target_height, target_width, self.tile_size):
+            tile1 = resize_region(img1, target_width, target_height, tile.y0, tile.y1, tile.x0, tile.x1)
+            tile2 = resize_region(img2, target_width, target_height, tile.y0, tile.y1, tile.x0, tile.x1)
+            self._blend_kernel(tile1, tile2, rows[tile.y0:tile.y1], cols[:, tile.x0:tile.x1],
+                               blended[tile.core])
+        
+        return blended
     
     def create_custom_mask(self, height, width, mask_points, output_path=None):
 
@@ -169,29 +337,10 @@ class ImageBlending:
             
             # Save the mask
             mask_uint8 = (mask * 255).astype(np.uint8)
-            cv2.imwrite(output_path, mask_uint8)
+            write_image(output_path, mask_uint8)
             
             return mask, output_path
             
         except Exception as e:
             print(f"Error creating custom mask: {str(e)}")
-            return None, None
-    
-    def validate_image(self, image_path):
-        """Validate if the image file is supported and readable."""
-        if not os.path.exists(image_path):
-            return False, "File does not exist"
-        
-        # Check file extension
-        _, ext = os.path.splitext(image_path.lower())
-        if ext not in self.supported_formats:
-            return False, f"Unsupported format. Supported: {self.supported_formats}"
-        
-        # Try to load the image
-        try:
-            img = cv2.imread(image_path)
-            if img is None:
-                return False, "Could not load image"
-            return True, "Valid image"
-        except Exception as e:
-            return False, f"Error loading image: {str(e)}"
+            return None, None
\ No newline at end of file
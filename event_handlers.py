@@ -1,16 +1,22 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox
 import os
-import threading
 from datetime import datetime
 import logging
 
+from job_scheduler import QueueFullError
+from live_preview import PREVIEW_DEBOUNCE_MS
+
 
 class EventHandlers:
     
     def __init__(self, parent_app):
         self.app = parent_app
         self.logger = logging.getLogger(__name__)
+        
+        # Pending debounce timers and latest request number per preview canvas
+        self._preview_after_ids = {}
+        self._preview_generations = {}
 
     # === FILE SELECTION ===
     
@@ -114,12 +120,153 @@ class EventHandlers:
     
     def update_edge_opacity_label(self, value):
         self.app.edge_opacity_label.config(text=str(int(float(value))))
+        self.refresh_watermark_preview()
     
     def update_watermark_alpha_label(self, value):
         self.app.watermark_alpha_label.config(text=f"{float(value):.2f}")
+        self.refresh_watermark_preview()
     
     def update_blend_alpha_label(self, value):
         self.app.blend_alpha_label.config(text=f"{float(value):.2f}")
+        self.refresh_blend_preview()
+
+    # === LIVE PREVIEW ===
+    
+    def refresh_watermark_preview(self):
+        self._schedule_preview('watermark')
+    
+    def refresh_blend_preview(self):
+        self._schedule_preview('blend')
+    
+    def _schedule_preview(self, target):
+        if not self.app.live_preview_enabled.get():
+            return
+        
+        # Debounce: every slider movement restarts the timer, so a drag renders once it settles
+        after_id = self._preview_after_ids.pop(target, None)
+        if after_id is not None:
+            self.app.root.after_cancel(after_id)
+        self._preview_after_ids[target] = self.app.root.after(
+            PREVIEW_DEBOUNCE_MS, self._start_preview, target)
+    
+    def _start_preview(self, target):
+        self._preview_after_ids.pop(target, None)
+        
+        if target == 'watermark':
+            if not self.app.main_image_path or not self.app.watermark_image_path:
+                return
+            kind = self.app.watermark_type.get()
+            params = {
+                'main_image_path': self.app.main_image_path,
+                'watermark_image_path': self.app.watermark_image_path,
+                'edge_opacity': self.app.edge_opacity.get(),
+                'watermark_alpha': self.app.watermark_alpha.get()
+            }
+        else:
+            if not self.app.main_image_path or not self.app.second_image_path:
+                return
+            kind = 'blend'
+            params = {
+                'image1_path': self.app.main_image_path,
+                'image2_path': self.app.second_image_path,
+                'direction': self.app.blend_direction.get(),
+                'alpha': self.app.blend_alpha.get(),
+                'blend_mode': self.app.blend_mode.get()
+            }
+        
+        # Coalesce: older requests for this canvas are cancelled and never shown
+        generation = self._preview_generations.get(target, 0) + 1
+        self._preview_generations[target] = generation
+        for job in self.app.preview_scheduler.pending_jobs:
+            if job.name == target:
+                job.cancel()
+        
+        try:
+            self.app.preview_scheduler.submit(
+                self.app.live_preview.render, kind, params, name=target,
+                on_success=lambda image: self._show_preview(target, generation, image),
+                on_error=lambda error: self.logger.error(f"Live preview failed: {error}")
+            )
+        except QueueFullError:
+            # The worker is still finishing an older preview; try again shortly
+            self._schedule_preview(target)
+    
+    def _show_preview(self, target, generation, preview_image):
+        if generation != self._preview_generations.get(target):
+            return
+        
+        if target == 'watermark':
+            canvas_attr, status_attr = 'watermark_result_canvas', 'watermark_status'
+        else:
+            canvas_attr, status_attr = 'blend_result_canvas', 'blending_status'
+        
+        if hasattr(self.app, canvas_attr):
+            self.app.gui_components.display_image_preview(getattr(self.app, canvas_attr), None,
+                                                          preview_image=preview_image)
+        if hasattr(self.app, status_attr):
+            getattr(self.app, status_attr).config(text="Live preview (not saved)", 
+                                                  fg=self.app.gui_components.colors['primary'])
+
+    # === JOB SCHEDULING ===
+    
+    def _submit_job(self, job_func, params, status_attr, on_success, on_error):
+        try:
+            return self.app.job_scheduler.submit(
+                job_func, params,
+                on_success=lambda result: self._job_finished(result, on_success, on_error),
+                on_error=on_error,
+                on_progress=lambda job, status: self._job_progress(status_attr, status),
+                pass_token=True
+            )
+        except QueueFullError:
+            messagebox.showwarning("Busy", 
+                "Too many operations are queued. Please wait for some to finish.")
+            return None
+    
+    def _job_finished(self, result, on_success, on_error):
+        result_path, preview_image = result
+        if result_path:
+            self.app.file_manager.record_result(result_path)
+            on_success(result_path, preview_image)
+        else:
+            on_error()
+    
+    def _job_progress(self, status_attr, status):
+        status_texts = {
+            'queued': "Queued...",
+            'running': "Processing...",
+            'cancelled': "Cancelled"
+        }
+        if status in status_texts and hasattr(self.app, status_attr):
+            getattr(self.app, status_attr).config(text=status_texts[status], 
+                                                  fg=self.app.gui_components.colors['warning'])
+    
+    def cancel_jobs(self):
+        cancelled = self.app.job_scheduler.cancel_all()
+        self.logger.info(f"Cancelled {cancelled} job(s)")
+        
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.app.results_text.insert(tk.END, f"[{timestamp}] Cancelled {cancelled} job(s)\n\n")
+        self.app.results_text.see(tk.END)
+
+    # === RESULT PREVIEWS ===
+    
+    def _preview_collector(self, preview, token):
+        # Runs in the worker between computing and saving: a cancelled job stops
+        # here without writing; otherwise keep only a small copy of the result
+        def collect(result):
+            token.raise_if_cancelled()
+            preview['image'] = self.app.gui_components.thumbnail_cache.from_array(result)
+        return collect
+    
+    def _cache_preview(self, result_path, preview):
+        preview_image = preview.get('image')
+        if result_path and preview_image is not None:
+            try:
+                self.app.gui_components.thumbnail_cache.put(result_path, preview_image)
+            except OSError as e:
+                self.logger.error(f"Could not cache result preview: {str(e)}")
+        return preview_image
 
     # === WATERMARKING ===
     
@@ -138,40 +285,39 @@ class EventHandlers:
             messagebox.showerror("Error", f"Watermark image error: {watermark_msg}")
             return
         
-        if hasattr(self.app, 'watermark_status'):
-            self.app.watermark_status.config(text="Processing...", 
-                                            fg=self.app.gui_components.colors['warning'])
+        # Snapshot parameters now so later UI changes cannot affect the queued job
+        params = {
+            'watermark_type': self.app.watermark_type.get(),
+            'main_image_path': self.app.main_image_path,
+            'watermark_image_path': self.app.watermark_image_path,
+            'edge_opacity': self.app.edge_opacity.get(),
+            'watermark_alpha': self.app.watermark_alpha.get()
+        }
         
-        threading.Thread(target=self._apply_watermark_thread, daemon=True).start()
+        self._submit_job(self._apply_watermark_job, params, 'watermark_status',
+                         self._watermark_success, self._watermark_error)
     
-    def _apply_watermark_thread(self):
-        try:
-            watermark_type = self.app.watermark_type.get()
-            
-            if watermark_type == 'visible':
-                edge_opacity = self.app.edge_opacity.get()
-                result_path = self.app.watermarking.visible_watermark(
-                    self.app.main_image_path, 
-                    self.app.watermark_image_path, 
-                    edge_opacity
-                )
-            else:
-                watermark_alpha = self.app.watermark_alpha.get()
-                result_path = self.app.watermarking.invisible_watermark(
-                    self.app.main_image_path, 
-                    self.app.watermark_image_path, 
-                    watermark_alpha
-                )
-            
-            if result_path:
-                self.app.root.after(0, self._watermark_success, result_path)
-            else:
-                self.app.root.after(0, self._watermark_error)
-                
-        except Exception as e:
-            self.app.root.after(0, self._watermark_error, str(e))
-    
-    def _watermark_success(self, result_path):
+    def _apply_watermark_job(self, params, token):
+        preview = {}
+        
+        if params['watermark_type'] == 'visible':
+            result_path = self.app.watermarking.visible_watermark(
+                params['main_image_path'], 
+                params['watermark_image_path'], 
+                params['edge_opacity'],
+                on_result=self._preview_collector(preview, token)
+            )
+        else:
+            result_path = self.app.watermarking.invisible_watermark(
+                params['main_image_path'], 
+                params['watermark_image_path'], 
+                params['watermark_alpha'],
+                on_result=self._preview_collector(preview, token)
+            )
+        
+        return result_path, self._cache_preview(result_path, preview)
+    
+    def _watermark_success(self, result_path, preview_image=None):
         self.logger.info(f"Watermarking completed: {result_path}")
         
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -183,7 +329,8 @@ class EventHandlers:
         if hasattr(self.app, 'watermark_result_canvas'):
             self.app.gui_components.display_image_preview(
                 self.app.watermark_result_canvas, 
-                result_path
+                result_path,
+                preview_image=preview_image
             )
         
         if hasattr(self.app, 'watermark_status'):
@@ -214,33 +361,36 @@ class EventHandlers:
             messagebox.showerror("Error", "Please select both images to blend.")
             return
         
-        if hasattr(self.app, 'blending_status'):
-            self.app.blending_status.config(text="Blending images...", 
-                                           fg=self.app.gui_components.colors['warning'])
+        # Snapshot parameters now so later UI changes cannot affect the queued job
+        params = {
+            'blend_mode': self.app.blend_mode.get(),
+            'image1_path': self.app.main_image_path,
+            'image2_path': self.app.second_image_path,
+            'direction': self.app.blend_direction.get(),
+            'alpha': self.app.blend_alpha.get()
+        }
         
-        threading.Thread(target=self._blend_images_thread, daemon=True).start()
+        self._submit_job(self._blend_images_job, params, 'blending_status',
+                         self._blend_success, self._blend_error)
     
-    def _blend_images_thread(self):
-        try:
-            direction = self.app.blend_direction.get()
-            alpha = self.app.blend_alpha.get()
-            
-            result_path = self.app.blending.blend_images(
-                self.app.main_image_path,
-                self.app.second_image_path,
-                direction,
-                alpha
-            )
-            
-            if result_path:
-                self.app.root.after(0, self._blend_success, result_path)
-            else:
-                self.app.root.after(0, self._blend_error)
-                
-        except Exception as e:
-            self.app.root.after(0, self._blend_error, str(e))
-    
-    def _blend_success(self, result_path):
+    def _blend_images_job(self, params, token):
+        if params['blend_mode'] == 'multiband':
+            blend = self.app.blending.multiband_blend
+        else:
+            blend = self.app.blending.blend_images
+        
+        preview = {}
+        result_path = blend(
+            params['image1_path'],
+            params['image2_path'],
+            params['direction'],
+            params['alpha'],
+            on_result=self._preview_collector(preview, token)
+        )
+        
+        return result_path, self._cache_preview(result_path, preview)
+    
+    def _blend_success(self, result_path, preview_image=None):
         self.logger.info(f"Blending completed: {result_path}")
         
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -252,7 +402,8 @@ class EventHandlers:
         if hasattr(self.app, 'blend_result_canvas'):
             self.app.gui_components.display_image_preview(
                 self.app.blend_result_canvas, 
-                result_path
+                result_path,
+                preview_image=preview_image
             )
         
         if hasattr(self.app, 'blending_status'):
@@ -283,31 +434,28 @@ class EventHandlers:
             messagebox.showerror("Error", "Please select both original and watermarked images.")
             return
         
-        if hasattr(self.app, 'extraction_status'):
-            self.app.extraction_status.config(text="Extracting watermark...", 
-                                             fg=self.app.gui_components.colors['warning'])
+        # Snapshot parameters now so later UI changes cannot affect the queued job
+        params = {
+            'method': self.app.extraction_method.get(),
+            'original_image_path': self.app.main_image_path,
+            'watermarked_image_path': self.app.watermark_image_path
+        }
         
-        threading.Thread(target=self._extract_watermark_thread, daemon=True).start()
+        self._submit_job(self._extract_watermark_job, params, 'extraction_status',
+                         self._extraction_success, self._extraction_error)
     
-    def _extract_watermark_thread(self):
-        try:
-            method = self.app.extraction_method.get()
-            
-            result_path = self.app.watermarking.extract_watermark(
-                self.app.main_image_path,
-                self.app.watermark_image_path,
-                method
-            )
-            
-            if result_path:
-                self.app.root.after(0, self._extraction_success, result_path)
-            else:
-                self.app.root.after(0, self._extraction_error)
-                
-        except Exception as e:
-            self.app.root.after(0, self._extraction_error, str(e))
-    
-    def _extraction_success(self, result_path):
+    def _extract_watermark_job(self, params, token):
+        preview = {}
+        result_path = self.app.watermarking.extract_watermark(
+            params['original_image_path'],
+            params['watermarked_image_path'],
+            params['method'],
+            on_result=self._preview_collector(preview, token)
+        )
+        
+        return result_path, self._cache_preview(result_path, preview)
+    
+    def _extraction_success(self, result_path, preview_image=None):
         self.logger.info(f"Extraction completed: {result_path}")
         
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -319,7 +467,8 @@ class EventHandlers:
         if hasattr(self.app, 'extract_result_canvas'):
             self.app.gui_components.display_image_preview(
                 self.app.extract_result_canvas, 
-                result_path
+                result_path,
+                preview_image=preview_image
             )
         
         if hasattr(self.app, 'extraction_status'):
@@ -1,12 +1,70 @@
 import os
+import uuid
 import shutil
 from datetime import datetime
 import logging
 
+try:
+    import fcntl
+except ImportError:
+    # Windows has no FICLONE ioctl; clone_file falls back to copying
+    fcntl = None
+
+from result_index import ResultIndex, DEFAULT_INDEX_NAME
+from retention import RetentionEngine, RetentionPolicy
+from result_cache import file_digest, add_write_listener, remove_write_listener
+
+
+# Linux ioctl that shares extents copy-on-write (Btrfs, XFS with reflink, ...)
+FICLONE = 0x40049409
+
+# Content-addressed store inside each backup directory
+BACKUP_OBJECTS_DIR = '.objects'
+
+# Directories holding generated outputs, the only ones cleanup may touch
+OUTPUT_DIR_NAMES = ('watermarked', 'blended', 'results')
+
+
+def clone_file(src, dst):
+    """Copy src to dst as a reflink when the filesystem supports it, else a full copy.
+    
+    Returns 'reflink' or 'copy'. Unlike a hard link, dst stays independent of src.
+    """
+    if fcntl is not None:
+        try:
+            with open(src, 'rb') as src_file, open(dst, 'wb') as dst_file:
+                fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+            shutil.copystat(src, dst)
+            return 'reflink'
+        except OSError:
+            # Different filesystem or no reflink support
+            pass
+    
+    shutil.copy2(src, dst)
+    return 'copy'
+
+
+def link_or_copy(src, dst):
+    """Hard link dst to src when both are on one filesystem, else clone_file.
+    
+    Only for files that are never modified in place, such as results (written
+    through a temporary file and rename) and backup objects.
+    """
+    # Link under a temporary name, then rename over dst, so an existing dst is replaced atomically
+    temp_path = f"{dst}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        os.link(src, temp_path)
+        os.replace(temp_path, dst)
+        return 'hardlink'
+    except OSError:
+        if os.path.lexists(temp_path):
+            os.remove(temp_path)
+        return clone_file(src, dst)
+
 
 class FileManager:
     
-    def __init__(self):
+    def __init__(self, index_path=None, retention_policies=None, reconcile=True):
         self.base_dirs = {
             'images': 'images',
             'watermarked': 'watermarked_images',
@@ -17,6 +75,39 @@ class FileManager:
         
         # Create directories if they don't exist
         self.create_directories()
+        
+        # Listing and size queries are answered from the index instead of walking directories
+        if index_path is None:
+            index_path = os.path.join(self.base_dirs['logs'], DEFAULT_INDEX_NAME)
+        self.index = ResultIndex(index_path)
+        if reconcile:
+            self.reconcile_index()
+        
+        # Every result written through write_image in this process is indexed as it lands
+        add_write_listener(self.record_result)
+        
+        # Quotas and age limits are opt-in (see RECOMMENDED_RETENTION_POLICIES);
+        # without them nothing is deleted automatically
+        self.retention = RetentionEngine(self.index, self.base_dirs, retention_policies or {})
+    
+    def reconcile_index(self):
+        """Sync the index with the disk, e.g. after files were changed outside the app."""
+        for dir_name, dir_path in self.base_dirs.items():
+            self.index.reconcile(dir_name, dir_path)
+    
+    def _dir_name_for(self, file_path):
+        path = os.path.abspath(file_path)
+        for dir_name, dir_path in self.base_dirs.items():
+            if path.startswith(os.path.abspath(dir_path) + os.sep):
+                return dir_name
+        return None
+    
+    def record_result(self, file_path):
+        """Add a newly written file to the index; files outside the base directories are ignored."""
+        dir_name = self._dir_name_for(file_path)
+        if dir_name is None:
+            return False
+        return self.index.add(file_path, dir_name)
     
     def create_directories(self):
         """Create necessary directories for the application."""
@@ -25,7 +116,8 @@ class FileManager:
                 os.makedirs(dir_path)
                 logging.info(f"Created directory: {dir_path}")
     
-    def organize_result(self, file_path, operation_type, timestamp=None):
+    def organize_result(self, file_path, operation_type, timestamp=None, move=False):
+        """File a result under its operation directory; move=True renames instead of linking."""
 
         if timestamp is None:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -46,32 +138,48 @@ class FileManager:
         organized_filename = f"{operation_type}_{timestamp}_{name}{ext}"
         organized_path = os.path.join(target_dir, organized_filename)
         
-        # Copy file to organized location
+        # Link, rename or clone to the organized location; bytes are copied only as a last resort
         try:
-            shutil.copy2(file_path, organized_path)
-            logging.info(f"Organized file: {file_path} -> {organized_path}")
+            if move:
+                try:
+                    os.replace(file_path, organized_path)
+                    method = 'rename'
+                except OSError:
+                    # Different filesystem: shutil.move copies, then deletes the source
+                    shutil.move(file_path, organized_path)
+                    method = 'move'
+                self.index.remove(file_path)
+            else:
+                method = link_or_copy(file_path, organized_path)
+            
+            self.record_result(organized_path)
+            logging.info(f"Organized file ({method}): {file_path} -> {organized_path}")
             return organized_path
         except Exception as e:
             logging.error(f"Error organizing file: {str(e)}")
             return file_path
     
     def cleanup_old_files(self, days=30):
-
-        current_time = datetime.now().timestamp()
-        cutoff_time = current_time - (days * 24 * 60 * 60)
+        """Delete output files older than days; returns what was reclaimed per directory."""
+        policies = {dir_name: RetentionPolicy(max_age_days=days) for dir_name in OUTPUT_DIR_NAMES}
+        return self.retention.run_once(policies, throttled=False)
+    
+    def start_retention(self, is_busy=None):
+        """Enforce retention policies periodically in the background, pausing while is_busy().
         
-        for dir_name, dir_path in self.base_dirs.items():
-            if os.path.exists(dir_path):
-                for filename in os.listdir(dir_path):
-                    file_path = os.path.join(dir_path, filename)
-                    if os.path.isfile(file_path):
-                        file_time = os.path.getmtime(file_path)
-                        if file_time < cutoff_time:
-                            try:
-                                os.remove(file_path)
-                                logging.info(f"Cleaned up old file: {file_path}")
-                            except Exception as e:
-                                logging.error(f"Error cleaning up file {file_path}: {str(e)}")
+        Does nothing unless the FileManager was given retention_policies.
+        """
+        self.retention.is_busy = is_busy
+        self.retention.start()
+    
+    def stop_retention(self):
+        self.retention.stop(timeout=5)
+    
+    def close(self):
+        """Stop retention, stop indexing writes and close the index."""
+        self.stop_retention()
+        remove_write_listener(self.record_result)
+        self.index.close()
     
     def get_file_info(self, file_path):
 
@@ -87,51 +195,102 @@ class FileManager:
             'path': file_path
         }
     
-    def list_results(self, operation_type=None):
-
+    def list_results(self, operation_type=None, name_prefix=None, limit=None, offset=0):
+        """Top-level files, newest first; name_prefix filters e.g. 'visible_watermark'."""
         results = []
         
         for dir_name, dir_path in self.base_dirs.items():
             if operation_type and dir_name != operation_type:
                 continue
-                
-            if os.path.exists(dir_path):
-                for filename in os.listdir(dir_path):
-                    file_path = os.path.join(dir_path, filename)
-                    if os.path.isfile(file_path):
-                        file_info = self.get_file_info(file_path)
-                        if file_info:
-                            results.append(file_info)
+            
+            # Sorted and paginated by the index; a single directory needs no merge
+            if operation_type:
+                rows = self.index.query(parent=dir_path, name_prefix=name_prefix, limit=limit, offset=offset)
+            else:
+                rows = self.index.query(parent=dir_path, name_prefix=name_prefix,
+                                        limit=None if limit is None else offset + limit)
+            
+            for row in rows:
+                results.append({
+                    'name': row['name'],
+                    'size': row['size'],
+                    'created': datetime.fromtimestamp(row['ctime']),
+                    'modified': datetime.fromtimestamp(row['mtime']),
+                    'path': row['path']
+                })
         
         # Sort by modification time (newest first)
         results.sort(key=lambda x: x['modified'], reverse=True)
+        if not operation_type and limit is not None:
+            results = results[offset:offset + limit]
         return results
     
     def create_backup(self, file_path, backup_dir=None):
-
+        """Back up file_path; identical contents are stored once however many backups refer to them."""
         if not os.path.exists(file_path):
             return None
         
         if backup_dir is None:
             backup_dir = os.path.join(self.base_dirs['results'], 'backups')
         
-        if not os.path.exists(backup_dir):
-            os.makedirs(backup_dir)
+        objects_dir = os.path.join(backup_dir, BACKUP_OBJECTS_DIR)
+        os.makedirs(objects_dir, exist_ok=True)
         
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = os.path.basename(file_path)
         name, ext = os.path.splitext(filename)
-        backup_filename = f"{name}_backup_{timestamp}{ext}"
-        backup_path = os.path.join(backup_dir, backup_filename)
         
         try:
-            shutil.copy2(file_path, backup_path)
+            digest = file_digest(file_path)
+            object_path = os.path.join(objects_dir, f"{digest}{ext}")
+            
+            # The source may be edited in place later, so it is cloned, never hard linked
+            if not os.path.exists(object_path):
+                temp_path = os.path.join(objects_dir, f".{digest}.{uuid.uuid4().hex[:8]}.tmp")
+                clone_file(file_path, temp_path)
+                os.replace(temp_path, object_path)
+            
+            # Backup names are hard links to the shared object
+            backup_filename = f"{name}_backup_{timestamp}_{digest[:8]}{ext}"
+            backup_path = os.path.join(backup_dir, backup_filename)
+            if not os.path.exists(backup_path):
+                link_or_copy(object_path, backup_path)
+            
+            self.record_result(backup_path)
             logging.info(f"Created backup: {file_path} -> {backup_path}")
             return backup_path
         except Exception as e:
             logging.error(f"Error creating backup: {str(e)}")
             return None
     
+    def prune_backup_objects(self, backup_dir=None):
+        """Remove stored backup contents no longer referenced by any backup; returns bytes freed."""
+        if backup_dir is None:
+            backup_dir = os.path.join(self.base_dirs['results'], 'backups')
+        objects_dir = os.path.join(backup_dir, BACKUP_OBJECTS_DIR)
+        if not os.path.isdir(objects_dir):
+            return 0
+        
+        # Objects copied rather than linked (no hard link support) are matched by name
+        referenced = set()
+        for entry in os.scandir(backup_dir):
+            if entry.is_file():
+                stem, ext = os.path.splitext(entry.name)
+                referenced.add((stem.rsplit('_', 1)[-1], ext))
+        
+        freed = 0
+        for entry in os.scandir(objects_dir):
+            stat = entry.stat()
+            stem, ext = os.path.splitext(entry.name)
+            if stat.st_nlink > 1 or (stem[:8], ext) in referenced:
+                continue
+            try:
+                os.remove(entry.path)
+                freed += stat.st_size
+            except OSError as e:
+                logging.error(f"Error pruning backup object {entry.path}: {str(e)}")
+        return freed
+    
     def get_directory_size(self, dir_path):
 
         total_size = 0
@@ -146,17 +305,19 @@ class FileManager:
     def get_storage_info(self):
 
         storage_info = {}
-        total_size = 0
         
         for dir_name, dir_path in self.base_dirs.items():
             if os.path.exists(dir_path):
-                size = self.get_directory_size(dir_path)
+                # Includes subdirectories such as results/backups, like get_directory_size
+                size = self.index.total_size(dir_name)
                 storage_info[dir_name] = {
                     'path': dir_path,
                     'size': size,
                     'size_mb': size / (1024 * 1024)
                 }
-                total_size += size
+        
+        # Files hard linked into several directories are counted once in the total
+        total_size = self.index.total_size()
         
         storage_info['total'] = {
             'size': total_size,
@@ -1,8 +1,10 @@
 import tkinter as tk
 from tkinter import ttk, scrolledtext
-from PIL import Image, ImageTk
+from PIL import ImageTk
 import os
 
+from thumbnail_cache import ThumbnailCache
+
 
 class GUIComponents:
     
@@ -26,6 +28,7 @@ class GUIComponents:
         }
         
         self.preview_images = {}
+        self.thumbnail_cache = ThumbnailCache()
         
     def create_notebook(self):
         style = ttk.Style()
@@ -123,6 +126,7 @@ class GUIComponents:
         
         tk.Radiobutton(type_frame, text="Visible (Edge Detection)", 
                       variable=self.app.watermark_type, value='visible',
+                      command=self.app.refresh_watermark_preview,
                       font=('Segoe UI', 9), bg='white', 
                       fg=self.colors['text_dark'],
                       selectcolor=self.colors['primary'],
@@ -131,6 +135,7 @@ class GUIComponents:
         
         tk.Radiobutton(type_frame, text="Invisible (Frequency Domain)", 
                       variable=self.app.watermark_type, value='invisible',
+                      command=self.app.refresh_watermark_preview,
                       font=('Segoe UI', 9), bg='white', 
                       fg=self.colors['text_dark'],
                       selectcolor=self.colors['primary'],
@@ -194,6 +199,15 @@ class GUIComponents:
                                                  command=self.app.update_watermark_alpha_label)
         self.app.watermark_alpha_scale.pack(fill='x', pady=(5, 0))
         
+        # Live preview
+        tk.Checkbutton(settings_content, text="Live preview while adjusting",
+                      variable=self.app.live_preview_enabled,
+                      command=self.app.refresh_watermark_preview,
+                      font=('Segoe UI', 9), bg='white',
+                      fg=self.colors['text_dark'],
+                      activebackground='white',
+                      cursor='hand2').pack(anchor='w', pady=(0, 4))
+        
         # Apply button
         button_frame = tk.Frame(left_panel, bg='white')
         button_frame.pack(fill='x', pady=15, padx=15)
@@ -341,6 +355,7 @@ class GUIComponents:
         
         tk.Radiobutton(direction_frame, text="Left to Right", 
                       variable=self.app.blend_direction, value='horizontal',
+                      command=self.app.refresh_blend_preview,
                       font=('Segoe UI', 9), bg='white', 
                       fg=self.colors['text_dark'],
                       selectcolor=self.colors['primary'],
@@ -349,6 +364,7 @@ class GUIComponents:
         
         tk.Radiobutton(direction_frame, text="Top to Bottom", 
                       variable=self.app.blend_direction, value='vertical',
+                      command=self.app.refresh_blend_preview,
                       font=('Segoe UI', 9), bg='white', 
                       fg=self.colors['text_dark'],
                       selectcolor=self.colors['primary'],
@@ -357,6 +373,33 @@ class GUIComponents:
         
         tk.Radiobutton(direction_frame, text="Diagonal", 
                       variable=self.app.blend_direction, value='diagonal',
+                      command=self.app.refresh_blend_preview,
+                      font=('Segoe UI', 9), bg='white', 
+                      fg=self.colors['text_dark'],
+                      selectcolor=self.colors['primary'],
+                      activebackground='white',
+                      cursor='hand2').pack(anchor='w', pady=2)
+        
+        # Mode
+        tk.Label(settings_content, text="Blend Mode:", 
+                font=('Segoe UI', 9, 'bold'), bg='white',
+                fg=self.colors['text_dark']).pack(anchor='w', pady=(0, 8))
+        
+        mode_frame = tk.Frame(settings_content, bg='white')
+        mode_frame.pack(fill='x', pady=(0, 15))
+        
+        tk.Radiobutton(mode_frame, text="Gradient", 
+                      variable=self.app.blend_mode, value='gradient',
+                      command=self.app.refresh_blend_preview,
+                      font=('Segoe UI', 9), bg='white', 
+                      fg=self.colors['text_dark'],
+                      selectcolor=self.colors['primary'],
+                      activebackground='white',
+                      cursor='hand2').pack(anchor='w', pady=2)
+        
+        tk.Radiobutton(mode_frame, text="Multiband (Laplacian Pyramid)", 
+                      variable=self.app.blend_mode, value='multiband',
+                      command=self.app.refresh_blend_preview,
                       font=('Segoe UI', 9), bg='white', 
                       fg=self.colors['text_dark'],
                       selectcolor=self.colors['primary'],
@@ -390,6 +433,15 @@ class GUIComponents:
                                              command=self.app.update_blend_alpha_label)
         self.app.blend_alpha_scale.pack(fill='x', pady=(5, 0))
         
+        # Live preview
+        tk.Checkbutton(settings_content, text="Live preview while adjusting",
+                      variable=self.app.live_preview_enabled,
+                      command=self.app.refresh_blend_preview,
+                      font=('Segoe UI', 9), bg='white',
+                      fg=self.colors['text_dark'],
+                      activebackground='white',
+                      cursor='hand2').pack(anchor='w', pady=(0, 4))
+        
         # Apply button
         button_frame = tk.Frame(left_panel, bg='white')
         button_frame.pack(fill='x', pady=15, padx=15)
@@ -640,12 +692,21 @@ class GUIComponents:
                                                           borderwidth=5)
         self.app.results_text.pack(fill='both', expand=True)
         
-        # Clear button
-        tk.Button(text_frame, text="Clear Results", 
+        # Buttons
+        button_frame = tk.Frame(text_frame, bg='white')
+        button_frame.pack(pady=(10, 0))
+        
+        tk.Button(button_frame, text="Clear Results", 
                  command=self.app.clear_results,
                  bg=self.colors['danger'], fg='white',
                  font=('Segoe UI', 9, 'bold'), relief='flat',
-                 padx=15, pady=8, cursor='hand2').pack(pady=(10, 0))
+                 padx=15, pady=8, cursor='hand2').pack(side='left', padx=5)
+        
+        tk.Button(button_frame, text="Cancel Running Jobs", 
+                 command=self.app.cancel_jobs,
+                 bg=self.colors['warning'], fg='white',
+                 font=('Segoe UI', 9, 'bold'), relief='flat',
+                 padx=15, pady=8, cursor='hand2').pack(side='left', padx=5)
     
     def _create_control_section(self, parent, title):
         frame = tk.Frame(parent, bg='white')
@@ -676,17 +737,14 @@ class GUIComponents:
         
         return frame
     
-    def display_image_preview(self, canvas, image_path, max_width=300, max_height=250):
+    def display_image_preview(self, canvas, image_path, max_width=300, max_height=250, preview_image=None):
         try:
-            img = Image.open(image_path)
-            
-            img_width, img_height = img.size
-            scale = min(max_width / img_width, max_height / img_height, 1.0)
-            
-            new_width = int(img_width * scale)
-            new_height = int(img_height * scale)
-            
-            img_resized = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+            if preview_image is not None:
+                # Result previews arrive ready-made from the worker thread
+                img_resized = preview_image
+            else:
+                # Served from the memory/disk thumbnail cache when already rendered
+                img_resized = self.thumbnail_cache.get(image_path, max_width, max_height)
             photo = ImageTk.PhotoImage(img_resized)
             
             canvas.image = photo
@@ -0,0 +1,141 @@
+import os
+import threading
+import logging
+from collections import OrderedDict
+
+import cv2
+
+
+# Default memory budget for decoded images held by the process-wide cache
+DEFAULT_CACHE_BYTES = 512 * 1024 * 1024
+
+# Read flags that decode straight to 1/2, 1/4 or 1/8 scale. For JPEG, OpenCV
+# downscales in the DCT domain, so pixels are never decoded at full size.
+DRAFT_READ_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8
+}
+
+
+def draft_read_flags(draft_scale):
+    """cv2.imread flags for decoding at 1 / draft_scale resolution."""
+    if draft_scale not in DRAFT_READ_FLAGS:
+        raise ValueError(f"draft_scale must be one of {sorted(DRAFT_READ_FLAGS)}")
+    return DRAFT_READ_FLAGS[draft_scale]
+
+
+def choose_draft_scale(width, height, target_width, target_height):
+    """Largest draft scale that still decodes at least target_width x target_height."""
+    for draft_scale in (8, 4, 2):
+        if width // draft_scale >= target_width and height // draft_scale >= target_height:
+            return draft_scale
+    return 1
+
+
+class ImageCache:
+    """LRU cache of decoded images with a memory budget.
+
+    Entries are keyed by (path, mtime, size, read flags), so a file that changes
+    on disk is decoded again. Cached arrays are read-only because every caller
+    shares them; copy before modifying in place.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def read(self, image_path, flags=cv2.IMREAD_COLOR):
+        """Drop-in for cv2.imread: returns the decoded image or None."""
+        try:
+            stat = os.stat(image_path)
+        except (OSError, TypeError, ValueError):
+            return None
+
+        key = (os.path.abspath(image_path), stat.st_mtime_ns, stat.st_size, flags)
+
+        img = self.get(key)
+        if img is not None:
+            return img
+
+        # Decode outside the lock so other threads are not blocked
+        img = cv2.imread(image_path, flags)
+        if img is None:
+            return None
+
+        self.put(key, img)
+        return img
+
+    def get(self, key):
+        """The array cached under key, or None."""
+        with self._lock:
+            img = self._entries.get(key)
+            if img is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return img
+            self.misses += 1
+            return None
+
+    def put(self, key, img):
+        """Cache an array under any hashable key, e.g. images derived from a file; it becomes read-only."""
+        img.setflags(write=False)
+        self._store(key, img)
+
+    def _store(self, key, img):
+        if img.nbytes > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                return
+
+            self._entries[key] = img
+            self.current_bytes += img.nbytes
+
+            # Evict least recently used entries until back under budget
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= evicted.nbytes
+
+    def set_budget(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            while self._entries and self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= evicted.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+        logging.info("Decoded image cache cleared")
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+_image_cache = ImageCache()
+
+
+def get_image_cache():
+    """Get the process-wide decoded image cache."""
+    return _image_cache
+
+
+def imread(image_path, flags=cv2.IMREAD_COLOR):
+    """cv2.imread through the process-wide cache; the result is read-only."""
+    return _image_cache.read(image_path, flags)
@@ -0,0 +1,82 @@
+import os
+
+from PIL import Image, UnidentifiedImageError
+
+
+SUPPORTED_FORMATS = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff']
+
+# Bits per channel for PIL image modes (the header does not decode pixels)
+_MODE_BIT_DEPTHS = {
+    '1': 1,
+    'I;16': 16, 'I;16B': 16, 'I;16L': 16, 'I;16N': 16,
+    'I': 32, 'F': 32
+}
+
+# The pipeline decodes with cv2.IMREAD_COLOR: 3 channels of 8 bits whatever the file holds
+DECODED_CHANNELS = 3
+
+
+class ImageValidator:
+    """Validate images from their file header only, without decoding pixels."""
+
+    def __init__(self, supported_formats=None):
+        self.supported_formats = supported_formats or SUPPORTED_FORMATS
+
+    def probe(self, image_path):
+        """Read format, dimensions, channels and bit depth from the header."""
+        # Image.open is lazy: it parses the header and leaves pixel data on disk
+        with Image.open(image_path) as img:
+            width, height = img.size
+            channels = len(img.getbands())
+            bit_depth = _MODE_BIT_DEPTHS.get(img.mode, 8)
+            return {
+                'format': img.format,
+                'width': width,
+                'height': height,
+                'channels': channels,
+                'bit_depth': bit_depth,
+                'mode': img.mode,
+                'decoded_bytes': width * height * DECODED_CHANNELS
+            }
+
+    def validate_with_info(self, image_path):
+        """Return (is_valid, message, info); info is None when invalid."""
+        if not image_path:
+            return False, "No image path provided", None
+
+        if not os.path.exists(image_path):
+            return False, "File does not exist", None
+
+        # Check file extension
+        _, ext = os.path.splitext(image_path.lower())
+        if ext not in self.supported_formats:
+            return False, f"Unsupported format. Supported: {self.supported_formats}", None
+
+        try:
+            info = self.probe(image_path)
+        except UnidentifiedImageError:
+            return False, "Could not load image", None
+        except Exception as e:
+            return False, f"Error loading image: {str(e)}", None
+
+        if info['width'] == 0 or info['height'] == 0:
+            return False, "Image has no pixels", None
+
+        return True, "Valid image", info
+
+    def validate(self, image_path):
+        is_valid, message, _ = self.validate_with_info(image_path)
+        return is_valid, message
+
+
+_validator = ImageValidator()
+
+
+def validate_image(image_path):
+    """Header-only validation with the default supported formats."""
+    return _validator.validate(image_path)
+
+
+def probe_image(image_path):
+    """Header metadata for planning memory before any pixels are decoded."""
+    return _validator.probe(image_path)
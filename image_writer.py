@@ -0,0 +1,252 @@
+import os
+import threading
+from concurrent.futures import Future
+
+import cv2
+
+from job_scheduler import JobScheduler
+from result_cache import write_image, unique_output_path, get_result_cache
+from image_validation import ImageValidator, SUPPORTED_FORMATS
+
+
+# Output formats and the extension that selects OpenCV's encoder
+CODEC_EXTENSIONS = {
+    'jpg': '.jpg',
+    'png': '.png',
+    'webp': '.webp',
+    'tiff': '.tiff',
+    'bmp': '.bmp'
+}
+
+_FORMAT_FOR_EXTENSION = {'.jpg': 'jpg', '.jpeg': 'jpg', '.png': 'png', '.webp': 'webp',
+                         '.tif': 'tiff', '.tiff': 'tiff', '.bmp': 'bmp'}
+
+DEFAULT_WRITER_WORKERS = 2
+DEFAULT_WRITER_QUEUE = 8
+
+
+class CodecSettings:
+    """Output format and encoder options for cv2.imwrite.
+
+    quality applies to JPEG and WebP (1-100), optimize and progressive to JPEG,
+    png_compression to PNG (0-9) and lossless to WebP. Options left at None use
+    OpenCV's defaults (JPEG quality 95, PNG compression 1).
+    """
+
+    def __init__(self, format='jpg', quality=None, optimize=False, progressive=False,
+                 png_compression=None, lossless=False):
+        if format not in CODEC_EXTENSIONS:
+            raise ValueError(f"format must be one of {sorted(CODEC_EXTENSIONS)}")
+        self.format = format
+        self.quality = quality
+        self.optimize = optimize
+        self.progressive = progressive
+        self.png_compression = png_compression
+        self.lossless = lossless
+
+    @property
+    def extension(self):
+        return CODEC_EXTENSIONS[self.format]
+
+    def imwrite_params(self, output_path=None):
+        """cv2.imwrite flags; an output_path of a different format gets OpenCV defaults."""
+        if output_path is not None:
+            _, ext = os.path.splitext(output_path.lower())
+            if _FORMAT_FOR_EXTENSION.get(ext) != self.format:
+                return []
+
+        params = []
+        if self.format == 'jpg':
+            if self.quality is not None:
+                params += [cv2.IMWRITE_JPEG_QUALITY, int(self.quality)]
+            if self.optimize:
+                params += [cv2.IMWRITE_JPEG_OPTIMIZE, 1]
+            if self.progressive:
+                params += [cv2.IMWRITE_JPEG_PROGRESSIVE, 1]
+        elif self.format == 'png':
+            if self.png_compression is not None:
+                params += [cv2.IMWRITE_PNG_COMPRESSION, int(self.png_compression)]
+        elif self.format == 'webp':
+            # WebP quality above 100 selects lossless encoding
+            if self.lossless:
+                params += [cv2.IMWRITE_WEBP_QUALITY, 101]
+            elif self.quality is not None:
+                params += [cv2.IMWRITE_WEBP_QUALITY, int(self.quality)]
+        return params
+
+    def identity(self):
+        """Plain dict of the settings, e.g. for result cache keys."""
+        return dict(vars(self))
+
+
+DEFAULT_CODEC = CodecSettings()
+
+
+def completed_future(value):
+    """A Future that already holds value, e.g. for cache hits in asynchronous mode."""
+    future = Future()
+    future.set_result(value)
+    return future
+
+
+def _write_and_release(output_path, image, params, release):
+    # Released before the Future completes, so the caller may write once it has the result
+    try:
+        return write_image(output_path, image, params)
+    finally:
+        release()
+
+
+class AsyncImageWriter:
+    """Encode and write images on a thread pool behind a bounded queue.
+
+    submit returns as soon as the image is queued and gives a Future for the
+    final path. When max_workers + max_queue writes are pending, submit waits
+    for room, so producers cannot run ahead of the disk. OpenCV releases the
+    GIL while encoding, so writes overlap with computation in other threads.
+    """
+
+    def __init__(self, max_workers=DEFAULT_WRITER_WORKERS, max_queue=DEFAULT_WRITER_QUEUE):
+        self._scheduler = JobScheduler(max_workers=max_workers, max_queue=max_queue)
+
+        # id(array) -> [array, pending writes, writeable before the first one]
+        self._arrays = {}
+        self._arrays_lock = threading.Lock()
+
+    def submit(self, image, output_path, codec=None):
+        """Queue image for writing; returns a Future of output_path.
+
+        image is encoded later on another thread, so it stays read-only until
+        every pending write of it has finished, and the caller must not change
+        it before then.
+        """
+        release = self._hold(image)
+
+        params = (codec or DEFAULT_CODEC).imwrite_params(output_path)
+        try:
+            job = self._scheduler.submit(_write_and_release, output_path, image, params, release,
+                                         name=f"write {os.path.basename(output_path)}", block=True)
+        except Exception:
+            release()
+            raise
+
+        # A cancelled write never runs to release the array; release() only acts once
+        job.future.add_done_callback(lambda future: release())
+        return job.future
+
+    def _hold(self, image):
+        # Read-only while any write of it is pending; returns a one-shot release
+        with self._arrays_lock:
+            entry = self._arrays.setdefault(id(image), [image, 0, image.flags.writeable])
+            entry[1] += 1
+            image.setflags(write=False)
+
+        released = []
+
+        def release():
+            with self._arrays_lock:
+                if released:
+                    return
+                released.append(True)
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._arrays[id(image)]
+                    if entry[2]:
+                        image.setflags(write=True)
+
+        return release
+
+    def flush(self):
+        """Block until every queued write has finished."""
+        self._scheduler.wait()
+
+    def shutdown(self, wait=True):
+        self._scheduler.shutdown(wait=wait)
+
+
+# Worker threads are only started by the first submit
+_image_writer = AsyncImageWriter()
+
+
+def get_image_writer():
+    """Get the process-wide asynchronous writer."""
+    return _image_writer
+
+
+class CachedResultsMixin:
+    """Input validation and result caching and saving shared by Watermarking and ImageBlending.
+
+    Classes using it call super().__init__ and return the settings that change
+    their output from output_settings().
+    """
+
+    def __init__(self, cache_results=True, codecs=None, writer=None):
+        self.supported_formats = list(SUPPORTED_FORMATS)
+
+        # Identical inputs and parameters reuse the earlier output file
+        self.result_cache = get_result_cache() if cache_results else None
+
+        # Output format per operation name (see result_key calls); JPEG by default
+        self.codecs = codecs or {}
+
+        # With an AsyncImageWriter, path methods return a Future of the output path
+        # as soon as the result is queued for encoding
+        self.writer = writer
+
+    def validate_image(self, image_path):
+        """Validate if the image file is supported and readable (header only)."""
+        return ImageValidator(self.supported_formats).validate(image_path)
+
+    def get_image_metadata(self, image_path):
+        """Format, dimensions, channels and bit depth without decoding pixels."""
+        return ImageValidator(self.supported_formats).probe(image_path)
+
+    def output_settings(self):
+        return {}
+
+    def result_key(self, operation, input_paths, **params):
+        """Result cache key for operation on input_paths, or None without a cache."""
+        if self.result_cache is None:
+            return None
+
+        params.update(self.output_settings())
+        params.update(codec=self.codec_for(operation).identity())
+        return self.result_cache.key(operation, input_paths, params)
+
+    def codec_for(self, operation):
+        return self.codecs.get(operation, DEFAULT_CODEC)
+
+    def cached_result(self, output_path, default_prefix, key, operation=None):
+        """The stored output for key (a Future with a writer), or None to compute it."""
+        # Explicit output paths belong to the caller and are always written
+        if output_path is not None or key is None:
+            return None
+
+        cached_path = self.result_cache.lookup(default_prefix, key, self.codec_for(operation).extension)
+        if cached_path and self.writer is not None:
+            return completed_future(cached_path)
+        return cached_path
+
+    def save_result(self, result, output_path, default_prefix, on_result=None, key=None, operation=None):
+        """Write result; returns its path, or a Future of it with a writer.
+
+        on_result(result) runs first and may raise JobCancelled to stop before the write.
+        """
+        # Hand the in-memory result to the caller, e.g. for a preview thumbnail
+        if on_result is not None:
+            on_result(result)
+
+        # Generate output path if not provided: content-addressed when cached,
+        # otherwise timestamped with a random suffix so concurrent saves never collide
+        codec = self.codec_for(operation)
+        if output_path is None:
+            if key is not None:
+                output_path = self.result_cache.path_for(default_prefix, key, codec.extension)
+            else:
+                output_path = unique_output_path(default_prefix, codec.extension)
+
+        if self.writer is not None:
+            return self.writer.submit(result, output_path, codec)
+
+        # Save the result (temporary file and rename)
+        return write_image(output_path, result, codec.imwrite_params(output_path))
@@ -0,0 +1,182 @@
+import itertools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the scheduler queue is full."""
+
+
+class JobCancelled(Exception):
+    """Raised inside a job that notices its cancellation token was set."""
+
+
+class CancellationToken:
+    """Cooperative cancellation flag shared between a job and its submitter."""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        """Stop the job here if it was cancelled, e.g. between computing and saving."""
+        if self.cancelled:
+            raise JobCancelled("Job was cancelled")
+
+
+class Job:
+    """A submitted unit of work: its callbacks, cancellation token and future."""
+
+    def __init__(self, job_id, name, on_success, on_error, on_progress):
+        self.id = job_id
+        self.name = name
+        self.on_success = on_success
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.token = CancellationToken()
+        self.future = None
+        self.status = 'queued'
+
+    def cancel(self):
+        """Cancel the job; a queued job never starts, a running job stops at its next token check."""
+        self.token.cancel()
+        if self.future is not None:
+            self.future.cancel()
+
+
+class JobScheduler:
+    """Bounded worker pool with a queue depth limit, cancellation and callbacks.
+
+    Jobs run on a thread pool (GUI) or a process pool (headless batches). At most
+    max_workers jobs run at once and at most max_queue more wait; further submits
+    raise QueueFullError, or wait for room when block=True.
+
+    Callbacks are passed through dispatch, so the GUI can marshal them onto the
+    Tk thread with root.after. Without dispatch they run in the completing thread,
+    before wait() sees the job finish.
+    """
+
+    def __init__(self, max_workers=2, max_queue=8, dispatch=None, use_processes=False,
+                 initializer=None, initargs=(), mp_context=None):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.dispatch = dispatch or (lambda callback, *args: callback(*args))
+        self.use_processes = use_processes
+
+        if use_processes:
+            self._executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=mp_context,
+                                                 initializer=initializer, initargs=initargs)
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=max_workers, initializer=initializer,
+                                                initargs=initargs)
+
+        self._pending = {}
+        self._ids = itertools.count(1)
+        self._room = threading.Condition()
+
+    def submit(self, func, *args, name=None, on_success=None, on_error=None, on_progress=None,
+               block=False, timeout=None, pass_token=False):
+        """Queue func(*args). Arguments should be snapshots taken at submit time.
+
+        With pass_token, a thread pool job is called as func(*args, token=token)
+        and can stop at token.raise_if_cancelled() between its stages. Process
+        pool jobs cannot see the token; cancelling only keeps them from starting.
+        """
+        with self._room:
+            while len(self._pending) >= self.max_workers + self.max_queue:
+                if not block:
+                    raise QueueFullError(f"Too many jobs queued ({len(self._pending)})")
+                if not self._room.wait(timeout):
+                    raise QueueFullError("Timed out waiting for room in the job queue")
+
+            job = Job(next(self._ids), name or getattr(func, '__name__', 'job'),
+                      on_success, on_error, on_progress)
+            self._pending[job.id] = job
+
+        self._notify(job, 'queued')
+
+        try:
+            if self.use_processes:
+                job.future = self._executor.submit(func, *args)
+            else:
+                # Threads can report when they actually start and skip cancelled work
+                job.future = self._executor.submit(self._run_in_thread, job, func, args, pass_token)
+        except Exception:
+            # E.g. a broken process pool; the job must not be waited for
+            with self._room:
+                self._pending.pop(job.id, None)
+                self._room.notify_all()
+            self._notify(job, 'failed')
+            raise
+
+        job.future.add_done_callback(lambda future: self._finished(job))
+        return job
+
+    def _run_in_thread(self, job, func, args, pass_token):
+        job.token.raise_if_cancelled()
+        self._notify(job, 'running')
+        if pass_token:
+            return func(*args, token=job.token)
+        return func(*args)
+
+    def _finished(self, job):
+        try:
+            self._report(job)
+        finally:
+            # Only now is the job finished for wait()
+            with self._room:
+                self._pending.pop(job.id, None)
+                self._room.notify_all()
+
+    def _report(self, job):
+        future = job.future
+        if future.cancelled() or job.token.cancelled or isinstance(future.exception(), JobCancelled):
+            self._notify(job, 'cancelled')
+            return
+
+        error = future.exception()
+        if error is not None:
+            logging.error(f"Job {job.name} #{job.id} failed: {str(error)}")
+            self._notify(job, 'failed')
+            if job.on_error:
+                self.dispatch(job.on_error, str(error))
+            return
+
+        self._notify(job, 'done')
+        if job.on_success:
+            self.dispatch(job.on_success, future.result())
+
+    def _notify(self, job, status):
+        job.status = status
+        if job.on_progress:
+            self.dispatch(job.on_progress, job, status)
+
+    @property
+    def pending_jobs(self):
+        with self._room:
+            return list(self._pending.values())
+
+    def cancel_all(self):
+        """Cancel every queued and running job; returns how many were cancelled."""
+        jobs = self.pending_jobs
+        for job in jobs:
+            job.cancel()
+        return len(jobs)
+
+    def wait(self):
+        """Block until every submitted job has finished."""
+        with self._room:
+            while self._pending:
+                self._room.wait()
+
+    def shutdown(self, wait=True, cancel_pending=False):
+        if cancel_pending:
+            self.cancel_all()
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,160 @@
+import os
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from watermarking import Watermarking, PreparedWatermark, rfft_channels, irfft_channels, spatial_embed
+from blending import ImageBlending, MULTIBAND_LEVELS
+from image_cache import imread, draft_read_flags, choose_draft_scale
+from image_validation import probe_image
+from thumbnail_cache import ThumbnailCache
+
+
+# Delay after the last slider movement before a preview is rendered
+PREVIEW_DEBOUNCE_MS = 120
+
+# Proxies are fitted into the result canvas box
+PREVIEW_MAX_WIDTH = 300
+PREVIEW_MAX_HEIGHT = 250
+
+# Proxies plus data derived from them (fitted watermarks, spectra)
+DEFAULT_MAX_PROXIES = 16
+
+
+class LivePreview:
+    """Re-render results on small proxies of the inputs while sliders move.
+
+    Each input is decoded once at draft resolution and shrunk to the preview
+    box. Everything that does not depend on opacity or alpha is cached: the
+    edge map for visible watermarks, the resized watermark (or both spectra for
+    the FFT engine) for invisible watermarks and the unit gradient mask for
+    blends. A slider change then costs one weighted sum on a few hundred
+    thousand pixels.
+    """
+
+    def __init__(self, watermarking=None, blending=None, max_width=PREVIEW_MAX_WIDTH,
+                 max_height=PREVIEW_MAX_HEIGHT, max_items=DEFAULT_MAX_PROXIES):
+        self.watermarking = watermarking if watermarking is not None else Watermarking()
+        self.blending = blending if blending is not None else ImageBlending()
+        self.max_width = max_width
+        self.max_height = max_height
+        self.max_items = max_items
+
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def render(self, kind, params):
+        """Render a preview for 'visible', 'invisible' or 'blend'; returns a PIL image."""
+        if kind == 'visible':
+            result = self.visible_array(params['main_image_path'], params['watermark_image_path'],
+                                        params['edge_opacity'])
+        elif kind == 'invisible':
+            result = self.invisible_array(params['main_image_path'], params['watermark_image_path'],
+                                          params['watermark_alpha'])
+        elif kind == 'blend':
+            result = self.blend_array(params['image1_path'], params['image2_path'],
+                                      params['direction'], params['alpha'], params['blend_mode'])
+        else:
+            raise ValueError(f"Unknown preview kind: {kind}")
+
+        return ThumbnailCache.from_array(result, self.max_width, self.max_height)
+
+    def proxy(self, image_path):
+        """Draft-decoded copy of image_path fitted into the preview box (read-only)."""
+        return self._cached(('proxy', self._file_key(image_path)), lambda: self._load_proxy(image_path))
+
+    def _file_key(self, image_path):
+        # Derived entries share this key, so an edited file invalidates all of them
+        stat = os.stat(image_path)
+        return os.path.abspath(image_path), stat.st_mtime_ns, stat.st_size
+
+    def _load_proxy(self, image_path):
+        info = probe_image(image_path)
+        draft_scale = choose_draft_scale(info['width'], info['height'], self.max_width, self.max_height)
+
+        img = imread(image_path, draft_read_flags(draft_scale))
+        if img is None:
+            raise ValueError(f"Could not load image: {image_path}")
+
+        height, width = img.shape[:2]
+        scale = min(self.max_width / width, self.max_height / height, 1.0)
+        size = (max(int(width * scale), 1), max(int(height * scale), 1))
+
+        proxy = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+        proxy.setflags(write=False)
+        return proxy
+
+    def visible_array(self, main_image_path, watermark_image_path, edge_opacity):
+        main = self.proxy(main_image_path)
+        height, width = main.shape[:2]
+
+        # Same cached edge map the full pipeline uses, at proxy size
+        edges_3channel = PreparedWatermark(watermark_image_path).edge_map(width, height)
+        return cv2.addWeighted(main, 1.0, edges_3channel, edge_opacity / 100.0, 0)
+
+    def invisible_array(self, main_image_path, watermark_image_path, alpha):
+        main = self.proxy(main_image_path)
+        watermark = self._fitted_watermark(main, watermark_image_path)
+
+        if self.watermarking.fourier_engine not in ('fft', 'verify'):
+            return spatial_embed(main, watermark, alpha)
+
+        # Spectra of both proxies are kept; only the weighted sum is redone
+        main_key = self._file_key(main_image_path)
+        watermark_key = (self._file_key(watermark_image_path), main.shape)
+        main_fft = self._cached(('spectrum', main_key), lambda: rfft_channels(main))
+        watermark_fft = self._cached(('spectrum', watermark_key), lambda: rfft_channels(watermark))
+        watermarked = irfft_channels(main_fft + np.float32(alpha) * watermark_fft)
+        return np.clip(watermarked, 0, 255).astype(np.uint8)
+
+    def _fitted_watermark(self, main, watermark_image_path):
+        watermark = self.proxy(watermark_image_path)
+        height, width = main.shape[:2]
+
+        def fit():
+            fitted = cv2.resize(watermark, (width, height))
+            fitted.setflags(write=False)
+            return fitted
+
+        return self._cached(('fitted', self._file_key(watermark_image_path), width, height), fit)
+
+    def blend_array(self, image1_path, image2_path, direction, alpha, blend_mode='gradient'):
+        img1 = self.proxy(image1_path)
+        img2 = self.proxy(image2_path)
+        height, width = self.blending.target_size(img1, img2)
+
+        # Unit profiles are scaled per alpha, so dragging the slider does not
+        # fill the shared mask cache with one entry per slider position
+        rows, cols = self.blending.gradient_mask_profiles(height, width, direction, 1.0)
+        rows = rows * np.float32(alpha)
+        cols = cols * np.float32(alpha)
+
+        if blend_mode == 'multiband':
+            img1 = self.blending.resize_to(img1, width, height)
+            img2 = self.blending.resize_to(img2, width, height)
+            levels = max(0, min(MULTIBAND_LEVELS, int(np.log2(max(min(height, width), 1)))))
+            return self.blending.laplacian_blend(img1, img2, rows + cols, levels)
+
+        return self.blending.blend_with_profiles(img1, img2, rows, cols)
+
+    def _cached(self, key, compute):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+                return value
+
+        value = compute()
+
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
@@ -8,6 +8,10 @@ from blending import ImageBlending
 from gui_components import GUIComponents
 from event_handlers import EventHandlers
 from app_utils import AppUtils
+from file_manager import FileManager
+from job_scheduler import JobScheduler
+from thread_budget import ThreadBudget
+from live_preview import LivePreview
 
 
 class ImageProcessingApp:
@@ -25,6 +29,24 @@ class ImageProcessingApp:
         self.watermarking = Watermarking()
         self.blending = ImageBlending()
         
+        # One core budget for the job workers and OpenCV's internal threads
+        self.thread_budget = ThreadBudget.for_gui()
+        self.thread_budget.apply()
+        
+        # Bounded worker pool; callbacks are marshalled onto the Tk thread
+        self.job_scheduler = JobScheduler(
+            max_workers=self.thread_budget.workers, max_queue=4,
+            dispatch=lambda callback, *args: self.root.after(0, callback, *args)
+        )
+        
+        # Slider previews render on proxies in their own single worker, so they
+        # never wait behind full-resolution jobs
+        self.live_preview = LivePreview(self.watermarking, self.blending)
+        self.preview_scheduler = JobScheduler(
+            max_workers=1, max_queue=1,
+            dispatch=lambda callback, *args: self.root.after(0, callback, *args)
+        )
+        
         # Initialize GUI components and event handlers
         self.gui_components = GUIComponents(self)
         self.event_handlers = EventHandlers(self)
@@ -39,13 +61,19 @@ class ImageProcessingApp:
         self.watermark_alpha = tk.DoubleVar(value=0.1)
         self.blend_alpha = tk.DoubleVar(value=0.5)
         self.blend_direction = tk.StringVar(value='horizontal')
+        self.blend_mode = tk.StringVar(value='gradient')
         self.watermark_type = tk.StringVar(value='visible')
         self.extraction_method = tk.StringVar(value='fourier')
+        self.live_preview_enabled = tk.BooleanVar(value=True)
         
         # Setup logging and directories
         self.logger = AppUtils.setup_logging()
         AppUtils.create_directories()
         
+        # Index of result files, reconciled with the disk on startup
+        self.file_manager = FileManager()
+        self.file_manager.start_retention(is_busy=lambda: bool(self.job_scheduler.pending_jobs))
+        
         # Bind event handlers
         self._bind_event_handlers()
         
@@ -68,12 +96,15 @@ class ImageProcessingApp:
         self.update_edge_opacity_label = self.event_handlers.update_edge_opacity_label
         self.update_watermark_alpha_label = self.event_handlers.update_watermark_alpha_label
         self.update_blend_alpha_label = self.event_handlers.update_blend_alpha_label
+        self.refresh_watermark_preview = self.event_handlers.refresh_watermark_preview
+        self.refresh_blend_preview = self.event_handlers.refresh_blend_preview
         
         # Operation handlers
         self.apply_watermark = self.event_handlers.apply_watermark
         self.blend_images = self.event_handlers.blend_images
         self.extract_watermark = self.event_handlers.extract_watermark
         self.clear_results = self.event_handlers.clear_results
+        self.cancel_jobs = self.event_handlers.cancel_jobs
     
     def create_widgets(self):
         # Header
@@ -129,6 +160,9 @@ class ImageProcessingApp:
     def run(self):
         self.logger.info("Image Processing Application started")
         self.root.mainloop()
+        self.job_scheduler.shutdown(wait=False, cancel_pending=True)
+        self.preview_scheduler.shutdown(wait=False, cancel_pending=True)
+        self.file_manager.close()
 
 
 def main():
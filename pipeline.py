@@ -0,0 +1,118 @@
+import queue
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Marks the end of the input stream: (_END, number of items fed)
+_END = object()
+
+
+class Stage:
+    """One step of a Pipeline: func is applied to every item on its own pool of workers."""
+
+    def __init__(self, name, func, workers=1):
+        self.name = name
+        self.func = func
+        self.workers = workers
+
+
+class Pipeline:
+    """Stream items through stages that run concurrently, e.g. decode -> compute -> encode.
+
+    Every stage has its own thread pool, so while one image is being computed
+    the next is decoded and the previous one encoded. OpenCV releases the GIL
+    in decoding, encoding and most kernels, so threads overlap in practice.
+
+    At most max_in_flight items are between the input and the consumer at any
+    time (including finished items not yet consumed), which bounds memory to
+    that many images. With ordered=True results are yielded in input order.
+    """
+
+    def __init__(self, stages, max_in_flight=None, ordered=False):
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage")
+        self.stages = stages
+        # Enough items to keep every worker of every stage busy
+        self.max_in_flight = max_in_flight or 2 * sum(stage.workers for stage in stages)
+        self.ordered = ordered
+
+    def run(self, items):
+        """Yield (item, result, error) per input item; error is None on success.
+
+        A failing stage skips the remaining stages for that item only. Closing
+        the generator early cancels work that has not started.
+        """
+        executors = [ThreadPoolExecutor(max_workers=stage.workers, thread_name_prefix=stage.name)
+                     for stage in self.stages]
+        done = queue.Queue()
+        slots = threading.Semaphore(self.max_in_flight)
+        stop = threading.Event()
+
+        def advance(index, item, stage_index, value):
+            try:
+                future = executors[stage_index].submit(self.stages[stage_index].func, value)
+            except RuntimeError:
+                # Executors shut down because the consumer closed the generator
+                return
+            future.add_done_callback(lambda f: finished(index, item, stage_index, f))
+
+        def finished(index, item, stage_index, future):
+            if future.cancelled():
+                return
+            error = future.exception()
+            if error is None and stage_index + 1 < len(self.stages) and not stop.is_set():
+                advance(index, item, stage_index + 1, future.result())
+                return
+            done.put((index, item, None if error else future.result(), error))
+
+        def feed():
+            count = 0
+            try:
+                for item in items:
+                    # Wait for a free slot; consumed results give theirs back
+                    while not slots.acquire(timeout=0.1):
+                        if stop.is_set():
+                            return
+                    if stop.is_set():
+                        return
+                    advance(count, item, 0, item)
+                    count += 1
+            except Exception as e:
+                logging.error(f"Pipeline input failed: {str(e)}")
+            finally:
+                done.put((_END, count, None, None))
+
+        feeder = threading.Thread(target=feed, name='pipeline-feed', daemon=True)
+        feeder.start()
+
+        try:
+            total = None
+            yielded = 0
+            waiting = {}
+            next_index = 0
+
+            while total is None or yielded < total:
+                index, item, result, error = done.get()
+                if index is _END:
+                    total = item
+                    continue
+
+                if not self.ordered:
+                    yield item, result, error
+                    slots.release()
+                    yielded += 1
+                    continue
+
+                # Hold results that finished ahead of an earlier item
+                waiting[index] = (item, result, error)
+                while next_index in waiting:
+                    yield waiting.pop(next_index)
+                    slots.release()
+                    next_index += 1
+                    yielded += 1
+        finally:
+            stop.set()
+            for executor in executors:
+                executor.shutdown(wait=True, cancel_futures=True)
+            feeder.join()
@@ -0,0 +1,134 @@
+import os
+import json
+import uuid
+import hashlib
+import logging
+from datetime import datetime
+from functools import lru_cache
+
+import cv2
+
+
+# Bump when an algorithm changes its output, so old results are not reused
+RESULT_CACHE_VERSION = 1
+
+# Hex digits of the key kept in output names (80 bits)
+KEY_CHARS = 20
+
+_CHUNK_BYTES = 1024 * 1024
+
+# Called with every path write_image puts in place, e.g. FileManager.record_result
+_write_listeners = []
+
+
+@lru_cache(maxsize=1024)
+def _file_digest(path, mtime_ns, size):
+    # mtime_ns and size are part of the cache key so an edited file is hashed again
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_CHUNK_BYTES), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_digest(path):
+    """Content hash of a file, computed once per (path, mtime, size)."""
+    stat = os.stat(path)
+    return _file_digest(os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+
+def unique_output_path(default_prefix, ext='.jpg'):
+    """Timestamped output name with a random suffix, safe under concurrent saves."""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return f"{default_prefix}_{timestamp}_{uuid.uuid4().hex[:8]}{ext}"
+
+
+def add_write_listener(callback):
+    """Call callback(output_path) after each completed write_image in this process."""
+    _write_listeners.append(callback)
+
+
+def remove_write_listener(callback):
+    if callback in _write_listeners:
+        _write_listeners.remove(callback)
+
+
+def write_image(output_path, image, params=None):
+    """cv2.imwrite through a temporary file and rename, so readers never see partial output."""
+    directory, filename = os.path.split(output_path)
+    name, ext = os.path.splitext(filename)
+
+    # Same directory so the rename is atomic; same extension so OpenCV picks the codec.
+    # Created like cv2.imwrite would (0666 less the umask), not mkstemp's 0600
+    temp_path = os.path.join(directory or '.', f".{name}.{uuid.uuid4().hex[:8]}{ext}")
+    os.close(os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666))
+    try:
+        if not cv2.imwrite(temp_path, image, params or []):
+            raise ValueError(f"Could not write output: {output_path}")
+        os.replace(temp_path, output_path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    for listener in list(_write_listeners):
+        try:
+            listener(output_path)
+        except Exception as e:
+            logging.error(f"Error recording output {output_path}: {str(e)}")
+    return output_path
+
+
+class ResultCache:
+    """Content-addressed store for operation results.
+
+    The key hashes the operation, its parameters and the contents of every
+    input file, and becomes part of the output name. Running the same operation
+    on the same inputs again finds that file and skips the computation, and
+    different jobs can never write to the same name.
+    """
+
+    def __init__(self, version=RESULT_CACHE_VERSION):
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, operation, input_paths, params):
+        identity = {
+            'version': self.version,
+            'operation': operation,
+            'inputs': [file_digest(path) for path in input_paths],
+            'params': params
+        }
+        encoded = json.dumps(identity, sort_keys=True, default=str).encode('utf-8')
+        return hashlib.blake2b(encoded, digest_size=20).hexdigest()
+
+    def path_for(self, default_prefix, key, ext='.jpg'):
+        return f"{default_prefix}_{key[:KEY_CHARS]}{ext}"
+
+    def lookup(self, default_prefix, key, ext='.jpg'):
+        """Return the stored output for key, or None when it has to be computed."""
+        output_path = self.path_for(default_prefix, key, ext)
+        try:
+            if os.path.getsize(output_path) > 0:
+                # Touch so age-based cleanup sees the result as recently used
+                os.utime(output_path)
+                self.hits += 1
+                logging.info(f"Result cache hit: {output_path}")
+                return output_path
+        except OSError:
+            pass
+
+        self.misses += 1
+        return None
+
+    def get_stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+_result_cache = ResultCache()
+
+
+def get_result_cache():
+    """Get the process-wide result cache."""
+    return _result_cache
@@ -0,0 +1,196 @@
+import os
+import sqlite3
+import logging
+import threading
+
+
+DEFAULT_INDEX_NAME = 'results_index.db'
+
+# Bump when the table changes; an older index is dropped and rebuilt from the disk
+_SCHEMA_VERSION = 2
+
+# dev/ino identify hard links to one file (NULL where the platform has no inode numbers)
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    dir_name TEXT NOT NULL,
+    parent TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    ctime REAL NOT NULL,
+    dev INTEGER,
+    ino INTEGER
+);
+CREATE INDEX IF NOT EXISTS files_by_dir_mtime ON files (dir_name, mtime);
+CREATE INDEX IF NOT EXISTS files_by_parent_mtime ON files (parent, mtime);
+CREATE INDEX IF NOT EXISTS files_by_mtime ON files (mtime);
+"""
+
+# Sums each file's bytes once however many indexed hard links it has
+_TOTAL_SIZE_SQL = ("SELECT COALESCE(SUM(size), 0) FROM (SELECT MAX(size) AS size FROM files {where} "
+                   "GROUP BY COALESCE(dev || ':' || ino, path))")
+
+
+class ResultIndex:
+    """Persistent SQLite index of the files under the application directories.
+
+    Rows hold each file's size and times, so listing, filtering, sorting and
+    size totals are indexed queries instead of directory walks. The index is
+    updated as files are written or removed and reconciled with the disk on
+    startup. Size totals count hard-linked files once. Paths under root (the application directory, by default the
+    working directory) are stored relative to it, whichever form callers use.
+    """
+
+    def __init__(self, db_path, root=None):
+        self.db_path = db_path
+        self.root = os.path.abspath(root or os.getcwd())
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # One connection shared by the Tk thread and job callbacks
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            if self._conn.execute("PRAGMA user_version").fetchone()[0] < _SCHEMA_VERSION:
+                # The index only mirrors the disk, so the startup reconcile refills it
+                self._conn.execute("DROP TABLE IF EXISTS files")
+                self._conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+            self._conn.executescript(_SCHEMA)
+
+    def canonical_path(self, path):
+        """The form path is stored in: relative to root when inside it, else absolute."""
+        path = os.path.abspath(path)
+        if path == self.root or path.startswith(self.root + os.sep):
+            return os.path.relpath(path, self.root)
+        return path
+
+    def _is_index_file(self, path):
+        # The database and its -wal/-shm files live in an indexed directory
+        return os.path.abspath(path).startswith(os.path.abspath(self.db_path))
+
+    def add(self, path, dir_name, stat=None):
+        """Insert or refresh one file; returns False when it is not on disk."""
+        if self._is_index_file(path):
+            return False
+        try:
+            stat = stat or os.stat(path)
+        except OSError:
+            self.remove(path)
+            return False
+
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                               self._row(path, dir_name, stat))
+        return True
+
+    def remove(self, path):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM files WHERE path = ?", (self.canonical_path(path),))
+
+    def _row(self, path, dir_name, stat):
+        path = self.canonical_path(path)
+        inode = (stat.st_dev, stat.st_ino) if stat.st_ino else (None, None)
+        return (path, dir_name, os.path.dirname(path), os.path.basename(path),
+                stat.st_size, stat.st_mtime, stat.st_ctime) + inode
+
+    def reconcile(self, dir_name, dir_path):
+        """Bring the rows for dir_path in line with the disk; returns (added, removed)."""
+        with self._lock:
+            known = {path: (size, mtime) for path, size, mtime in self._conn.execute(
+                "SELECT path, size, mtime FROM files WHERE dir_name = ?", (dir_name,))}
+
+        upserts = []
+        seen = set()
+        stack = [dir_path] if os.path.isdir(dir_path) else []
+        while stack:
+            try:
+                entries = list(os.scandir(stack.pop()))
+            except OSError as e:
+                logging.error(f"Error scanning {dir_path}: {str(e)}")
+                continue
+
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    # Internal stores such as backups/.objects would count linked bytes twice
+                    if not entry.name.startswith('.'):
+                        stack.append(entry.path)
+                elif entry.is_file() and not self._is_index_file(entry.path):
+                    path = self.canonical_path(entry.path)
+                    stat = entry.stat()
+                    if not stat.st_ino:
+                        # scandir leaves inode numbers out on Windows
+                        stat = os.stat(entry.path)
+                    seen.add(path)
+                    if known.get(path) != (stat.st_size, stat.st_mtime):
+                        upserts.append(self._row(path, dir_name, stat))
+
+        removed = [(path,) for path in known if path not in seen]
+
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", upserts)
+            self._conn.executemany("DELETE FROM files WHERE path = ?", removed)
+
+        if upserts or removed:
+            logging.info(f"Reconciled index for {dir_path}: {len(upserts)} updated, {len(removed)} removed")
+        return len(upserts), len(removed)
+
+    def query(self, dir_name=None, parent=None, name_prefix=None, older_than=None,
+              limit=None, offset=0, newest_first=True):
+        """Rows as dicts (path, dir_name, name, size, mtime, ctime), sorted by mtime."""
+        clauses = []
+        args = []
+        if dir_name is not None:
+            clauses.append("dir_name = ?")
+            args.append(dir_name)
+        if parent is not None:
+            clauses.append("parent = ?")
+            args.append(self.canonical_path(parent))
+        if name_prefix:
+            clauses.append("name LIKE ? ESCAPE '\\'")
+            escaped = name_prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            args.append(escaped + '%')
+        if older_than is not None:
+            clauses.append("mtime < ?")
+            args.append(older_than)
+
+        sql = "SELECT path, dir_name, name, size, mtime, ctime FROM files"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY mtime " + ("DESC" if newest_first else "ASC")
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            args.extend([limit, offset])
+
+        columns = ('path', 'dir_name', 'name', 'size', 'mtime', 'ctime')
+        with self._lock:
+            return [dict(zip(columns, row)) for row in self._conn.execute(sql, args)]
+
+    def total_size(self, dir_name=None, parent=None):
+        """Bytes under dir_name (including subdirectories), directly in parent, or in total."""
+        with self._lock:
+            if parent is not None:
+                row = self._conn.execute(_TOTAL_SIZE_SQL.format(where="WHERE parent = ?"),
+                                         (self.canonical_path(parent),)).fetchone()
+            elif dir_name is not None:
+                row = self._conn.execute(_TOTAL_SIZE_SQL.format(where="WHERE dir_name = ?"),
+                                         (dir_name,)).fetchone()
+            else:
+                row = self._conn.execute(_TOTAL_SIZE_SQL.format(where="")).fetchone()
+        return row[0]
+
+    def count(self, dir_name=None):
+        with self._lock:
+            if dir_name is None:
+                row = self._conn.execute("SELECT COUNT(*) FROM files").fetchone()
+            else:
+                row = self._conn.execute("SELECT COUNT(*) FROM files WHERE dir_name = ?",
+                                         (dir_name,)).fetchone()
+        return row[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
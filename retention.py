@@ -0,0 +1,185 @@
+import os
+import logging
+import threading
+from datetime import datetime
+
+
+GB = 1024 * 1024 * 1024
+
+# Deletions per second; keeps cleanup I/O well below what processing needs
+DEFAULT_DELETE_RATE = 50
+
+# Files deleted per index query
+DEFAULT_BATCH_SIZE = 100
+
+# Seconds between background passes
+DEFAULT_INTERVAL = 300
+
+
+class RetentionPolicy:
+    """Byte quota and age limit for the files directly inside one directory.
+
+    Subdirectories (e.g. results/backups) are never touched.
+    """
+
+    def __init__(self, max_bytes=None, max_age_days=None):
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+
+
+# Suggested limits for the output directories. Retention is opt-in: pass these
+# (or your own) as FileManager(retention_policies=...) to have outputs deleted.
+# images/ (source inputs) and logs/ should never get a policy.
+RECOMMENDED_RETENTION_POLICIES = {
+    'watermarked': RetentionPolicy(max_bytes=2 * GB, max_age_days=30),
+    'blended': RetentionPolicy(max_bytes=2 * GB, max_age_days=30),
+    'results': RetentionPolicy(max_bytes=1 * GB, max_age_days=30)
+}
+
+
+class RetentionEngine:
+    """Evict the oldest files from managed directories until every policy holds.
+
+    Candidates come from the ResultIndex, oldest first and a batch at a time,
+    so a pass never lists whole directories. Each candidate is stat'ed again
+    before deletion, so a file touched since it was indexed (e.g. by a result
+    cache hit) is kept and its row refreshed. Deletions are rate limited and
+    wait while is_busy() reports running jobs. Passes run on demand with
+    run_once or periodically in a background thread. Without policies nothing
+    is ever deleted.
+    """
+
+    def __init__(self, index, base_dirs, policies=None, delete_rate=DEFAULT_DELETE_RATE,
+                 batch_size=DEFAULT_BATCH_SIZE, interval=DEFAULT_INTERVAL, is_busy=None):
+        self.index = index
+        self.base_dirs = base_dirs
+        self.policies = policies if policies is not None else {}
+        self.delete_rate = delete_rate
+        self.batch_size = batch_size
+        self.interval = interval
+        self.is_busy = is_busy
+
+        self.last_report = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._pass_lock = threading.Lock()
+
+    def run_once(self, policies=None, throttled=True):
+        """Enforce policies now; returns {dir_name: {'files': n, 'bytes': b}} reclaimed.
+
+        throttled=False deletes at full speed, for explicit cleanups.
+        """
+        policies = policies if policies is not None else self.policies
+        report = {}
+
+        with self._pass_lock:
+            for dir_name, policy in policies.items():
+                dir_path = self.base_dirs.get(dir_name)
+                if dir_path is None or self._stopping(throttled):
+                    continue
+                reclaimed = {'files': 0, 'bytes': 0}
+                self._enforce_age(dir_path, policy, reclaimed, throttled)
+                self._enforce_quota(dir_path, policy, reclaimed, throttled)
+                report[dir_name] = reclaimed
+
+        total_files = sum(r['files'] for r in report.values())
+        total_bytes = sum(r['bytes'] for r in report.values())
+        if total_files:
+            logging.info(f"Retention reclaimed {total_bytes / (1024 * 1024):.1f} MB "
+                         f"in {total_files} file(s): {report}")
+
+        self.last_report = report
+        return report
+
+    def _enforce_age(self, dir_path, policy, reclaimed, throttled):
+        if policy.max_age_days is None:
+            return
+        cutoff_time = datetime.now().timestamp() - policy.max_age_days * 24 * 60 * 60
+
+        while not self._stopping(throttled):
+            rows = self.index.query(parent=dir_path, older_than=cutoff_time, newest_first=False,
+                                    limit=self.batch_size)
+            if not rows:
+                return
+            for row in rows:
+                if not self._delete(row, reclaimed, throttled, cutoff_time):
+                    return
+
+    def _enforce_quota(self, dir_path, policy, reclaimed, throttled):
+        if policy.max_bytes is None:
+            return
+        excess = self.index.total_size(parent=dir_path) - policy.max_bytes
+
+        while excess > 0 and not self._stopping(throttled):
+            rows = self.index.query(parent=dir_path, newest_first=False, limit=self.batch_size)
+            if not rows:
+                return
+            for row in rows:
+                freed = reclaimed['bytes']
+                if excess <= 0 or not self._delete(row, reclaimed, throttled):
+                    return
+                excess -= reclaimed['bytes'] - freed
+
+    def _delete(self, row, reclaimed, throttled, cutoff_time=None):
+        # Returns False when the pass should stop (engine stopping)
+        if throttled and not self._throttle():
+            return False
+
+        file_path = row['path']
+        try:
+            stat = os.stat(file_path)
+            if stat.st_mtime != row['mtime'] or stat.st_size != row['size']:
+                # Used or rewritten since it was indexed: keep it and let later
+                # queries see its real age and size
+                self.index.add(file_path, row['dir_name'], stat)
+                if cutoff_time is None or stat.st_mtime >= cutoff_time:
+                    return True
+
+            os.remove(file_path)
+            reclaimed['files'] += 1
+            # Removing one of several hard links frees no data
+            if stat.st_nlink <= 1:
+                reclaimed['bytes'] += stat.st_size
+            logging.info(f"Cleaned up old file: {file_path}")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.error(f"Error cleaning up file {file_path}: {str(e)}")
+            # Drop the row anyway so one stuck file cannot stall every later pass
+        self.index.remove(file_path)
+        return True
+
+    def _stopping(self, throttled):
+        # stop() ends background passes; explicit unthrottled passes always finish
+        return throttled and self._stop.is_set()
+
+    def _throttle(self):
+        # Wait out running jobs, then pace deletions at delete_rate per second
+        while self.is_busy is not None and self.is_busy():
+            if self._stop.wait(0.5):
+                return False
+        if self.delete_rate:
+            return not self._stop.wait(1.0 / self.delete_rate)
+        return not self._stop.is_set()
+
+    def start(self):
+        """Run passes every interval seconds in a daemon thread."""
+        if not self.policies or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name='retention', daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logging.error(f"Retention pass failed: {str(e)}")
+            self._stop.wait(self.interval)
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
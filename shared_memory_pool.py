@@ -0,0 +1,225 @@
+import os
+import threading
+import multiprocessing
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from job_scheduler import JobScheduler
+
+
+# Released blocks kept for reuse per worker; a batch of same-sized images
+# then runs on a fixed set of blocks instead of mapping new memory per image
+DEFAULT_FREE_BLOCKS_PER_WORKER = 4
+
+
+class SharedArray:
+    """A NumPy array stored in a multiprocessing.shared_memory block.
+
+    Pickling sends only the block name, shape and dtype; the receiving process
+    maps the same memory, so the pixels are never copied between processes.
+    """
+
+    def __init__(self, shm, shape, dtype):
+        self.shm = shm
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.array = np.ndarray(self.shape, self.dtype, buffer=shm.buf)
+
+    @classmethod
+    def from_array(cls, array):
+        """A new block holding a copy of array; whoever creates it must unlink() it."""
+        shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        shared = cls(shm, array.shape, array.dtype)
+        np.copyto(shared.array, array)
+        return shared
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def nbytes(self):
+        return self.array.nbytes
+
+    def __reduce__(self):
+        return _attach, (self.shm.name, self.shape, self.dtype.str)
+
+    def close(self):
+        """Unmap the block in this process; the memory lives on until it is unlinked."""
+        self.array = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # A caller still holds a view; the mapping goes away with it
+            pass
+
+    def unlink(self):
+        """Close and free the block in every process."""
+        self.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _attach(name, shape, dtype):
+    return SharedArray(shared_memory.SharedMemory(name=name), shape, dtype)
+
+
+def _run_shared(func, args, out):
+    # Runs in a worker process: map the inputs, compute, copy into the output block
+    arrays = [arg.array if isinstance(arg, SharedArray) else arg for arg in args]
+    result = None
+    try:
+        for array in arrays:
+            if isinstance(array, np.ndarray):
+                # Inputs may be shared with other jobs, so they must not be changed
+                array.setflags(write=False)
+
+        result = func(*arrays)
+        if result.shape != out.shape:
+            raise ValueError(f"Result shape {result.shape} does not match the output block {out.shape}")
+        np.copyto(out.array, result, casting='same_kind')
+    finally:
+        del arrays, result
+        for arg in args:
+            if isinstance(arg, SharedArray):
+                arg.close()
+        out.close()
+
+
+class SharedMemoryPool:
+    """Process pool for array operations that exchanges images through shared memory.
+
+    NumPy FFTs, large float32 operations and OpenCV release the GIL, but the
+    Python between those calls (dispatch, temporaries, small pyramid levels)
+    does not, so with many threads that part serialises. A plain process pool
+    would pickle every input and result; here inputs and outputs live in
+    shared memory blocks owned by this process and workers receive only
+    their names.
+
+    Blocks are recycled: release() returns a block for reuse by later
+    allocations of the same or a slightly smaller size.
+    """
+
+    def __init__(self, max_workers=None, max_queue=None, initializer=None, initargs=(),
+                 max_free_blocks=None):
+        max_workers = max_workers or os.cpu_count()
+        self.max_free_blocks = (max_free_blocks if max_free_blocks is not None
+                                else max_workers * DEFAULT_FREE_BLOCKS_PER_WORKER)
+
+        if os.name == 'posix':
+            # Workers must report to this process's resource tracker, or their own
+            # tracker would unlink blocks they mapped when the workers exit
+            from multiprocessing import resource_tracker
+            resource_tracker.ensure_running()
+
+        # Pools are typically fed by threads (decoders, the GUI); forking while one
+        # of them holds a lock inside OpenCV or malloc can deadlock the child
+        self._scheduler = JobScheduler(max_workers=max_workers,
+                                       max_queue=max_queue if max_queue is not None else max_workers,
+                                       use_processes=True, initializer=initializer, initargs=initargs,
+                                       mp_context=multiprocessing.get_context('spawn'))
+        self._free = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def allocate(self, shape, dtype=np.uint8):
+        """An uninitialised SharedArray, from a released block when one fits."""
+        nbytes = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+        with self._lock:
+            # Best fit, without wasting more than half of a block
+            fits = [shm for shm in self._free if nbytes <= shm.size <= 2 * nbytes]
+            if fits:
+                shm = min(fits, key=lambda block: block.size)
+                self._free.remove(shm)
+                return SharedArray(shm, shape, dtype)
+
+        return SharedArray(shared_memory.SharedMemory(create=True, size=nbytes), shape, dtype)
+
+    def share(self, array):
+        """Copy array into a SharedArray."""
+        shared = self.allocate(array.shape, array.dtype)
+        np.copyto(shared.array, array)
+        return shared
+
+    def release(self, shared):
+        """Give a block back once its array is no longer used."""
+        shm = shared.shm
+        shared.array = None
+        with self._lock:
+            if not self._closed and len(self._free) < self.max_free_blocks:
+                self._free.append(shm)
+                return
+        self._unlink(shm)
+
+    def _unlink(self, shm):
+        try:
+            shm.close()
+        except BufferError:
+            pass
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+    def submit(self, func, *args, out_shape=None, out_dtype=None):
+        """Run func(*args) in a worker; returns a Future for the result SharedArray.
+
+        NumPy arguments are copied into shared memory for the job, SharedArray
+        arguments are passed as they are and stay owned by the caller. func gets
+        plain read-only arrays and must return an array of out_shape and
+        out_dtype, which default to those of the first array argument. The
+        result block must be given back with release().
+        """
+        temporary = []
+        shared_args = []
+        for arg in args:
+            if isinstance(arg, np.ndarray):
+                arg = self.share(arg)
+                temporary.append(arg)
+            shared_args.append(arg)
+
+        if out_shape is None or out_dtype is None:
+            first = next((arg for arg in shared_args if isinstance(arg, SharedArray)), None)
+            if first is None:
+                raise ValueError("out_shape and out_dtype are required without array arguments")
+            out_shape = out_shape if out_shape is not None else first.shape
+            out_dtype = out_dtype if out_dtype is not None else first.dtype
+
+        out = self.allocate(out_shape, out_dtype)
+        result = Future()
+
+        def finished(future):
+            for shared in temporary:
+                self.release(shared)
+            if future.cancelled():
+                self.release(out)
+                result.cancel()
+            elif future.exception() is not None:
+                self.release(out)
+                result.set_exception(future.exception())
+            else:
+                result.set_result(out)
+
+        try:
+            job = self._scheduler.submit(_run_shared, func, shared_args, out,
+                                         name=getattr(func, '__name__', 'job'), block=True)
+        except Exception:
+            for shared in temporary + [out]:
+                self.release(shared)
+            raise
+
+        job.future.add_done_callback(finished)
+        return result
+
+    def shutdown(self, wait=True):
+        """Stop the workers and unlink the free blocks; blocks released later are unlinked too."""
+        self._scheduler.shutdown(wait=wait)
+        with self._lock:
+            self._closed = True
+            free, self._free = self._free, []
+        for shm in free:
+            self._unlink(shm)
@@ -0,0 +1,143 @@
+import os
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import cv2
+
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:
+    # Without threadpoolctl, BLAS limits only reach processes started afterwards
+    threadpool_limits = None
+
+
+# Read by OpenMP, OpenBLAS, MKL, Accelerate and numexpr when they load
+BLAS_THREAD_VARIABLES = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS',
+                         'VECLIB_MAXIMUM_THREADS', 'NUMEXPR_NUM_THREADS')
+
+# Decode/encode threads mostly wait on the disk, so they are not counted against the cores
+DEFAULT_IO_WORKERS = 2
+
+# Inputs decoded for an autotune run
+AUTOTUNE_SAMPLES = 4
+
+
+def available_cores():
+    """Cores this process may run on (its CPU affinity where supported)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def budget_splits(cores):
+    """Candidate (workers, opencv_threads) splits of a core budget, e.g. 8 -> 8x1, 4x2, 2x4, 1x8."""
+    splits = []
+    workers = cores
+    while workers >= 1:
+        splits.append((workers, cores // workers))
+        workers //= 2
+    return splits
+
+
+def _check_count(name, value):
+    if value is not None and value < 1:
+        raise ValueError(f"{name} must be at least 1, got {value}")
+
+
+class ThreadBudget:
+    """One core budget shared by worker pools, OpenCV threads and BLAS.
+
+    Each of the workers may run OpenCV with opencv_threads internal threads,
+    so by default workers * opencv_threads equals cores and nothing is
+    oversubscribed. Explicit workers and opencv_threads are used as given,
+    with a warning when they exceed the budget. BLAS gets blas_threads per
+    worker; this code mostly uses pocketfft and elementwise NumPy, which
+    never start threads, so BLAS stays at 1 unless a caller needs more.
+    """
+
+    def __init__(self, cores=None, workers=None, opencv_threads=None, blas_threads=1,
+                 io_workers=DEFAULT_IO_WORKERS):
+        for name, value in (('cores', cores), ('workers', workers), ('opencv_threads', opencv_threads)):
+            _check_count(name, value)
+
+        self.cores = cores or available_cores()
+        self.workers = workers or self.cores
+        self.opencv_threads = opencv_threads or max(1, self.cores // self.workers)
+        if self.workers * self.opencv_threads > self.cores:
+            logging.warning(f"{self.workers} worker(s) x {self.opencv_threads} OpenCV threads "
+                            f"oversubscribe {self.cores} core(s)")
+        self.blas_threads = blas_threads
+        self.io_workers = io_workers
+
+    @classmethod
+    def for_gui(cls, cores=None):
+        """Two job workers, with one core left for the Tk thread and previews."""
+        cores = max(1, cores or available_cores())
+        workers = min(2, cores)
+        return cls(cores, workers, max(1, (cores - 1) // workers))
+
+    def apply(self):
+        """Limit OpenCV and BLAS threads in this process and in processes it starts."""
+        cv2.setNumThreads(self.opencv_threads)
+
+        for name in BLAS_THREAD_VARIABLES:
+            os.environ[name] = str(self.blas_threads)
+        if threadpool_limits is not None:
+            threadpool_limits(self.blas_threads)
+
+        logging.info(f"Thread budget: {self}")
+
+    def __repr__(self):
+        return (f"{self.cores} core(s): {self.workers} worker(s) x {self.opencv_threads} OpenCV threads, "
+                f"{self.blas_threads} BLAS thread(s), {self.io_workers} I/O threads")
+
+
+def _init_autotune_worker(opencv_threads, initializer, initargs):
+    # The caller's initializer may set its own thread count, so ours comes last
+    if initializer is not None:
+        initializer(*initargs)
+    cv2.setNumThreads(opencv_threads)
+
+
+def autotune(workload, samples, cores=None, candidates=None, use_processes=False,
+             initializer=None, initargs=()):
+    """Benchmark splits of the core budget on this machine and return the fastest.
+
+    workload(sample) runs over samples on a pool of each candidate size, with
+    OpenCV limited to that split's threads. Time it on the executor the real
+    run uses: with use_processes, workload and samples must be picklable and
+    initializer(*initargs) prepares each worker process. Returns the best
+    ThreadBudget and {(workers, opencv_threads): items per second}.
+    """
+    _check_count('cores', cores)
+    cores = cores or available_cores()
+    candidates = candidates or budget_splits(cores)
+    previous_threads = cv2.getNumThreads()
+    timings = {}
+
+    try:
+        for workers, opencv_threads in candidates:
+            # Every worker runs twice, so a slow first item cannot dominate
+            items = [samples[i % len(samples)] for i in range(2 * workers)]
+            if use_processes:
+                executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_autotune_worker,
+                                               initargs=(opencv_threads, initializer, initargs))
+            else:
+                cv2.setNumThreads(opencv_threads)
+                executor = ThreadPoolExecutor(max_workers=workers)
+            with executor:
+                # Warm-up starts the workers, fills caches and starts OpenCV's pool at this size
+                list(executor.map(workload, items[:workers]))
+                start = time.perf_counter()
+                list(executor.map(workload, items))
+                elapsed = time.perf_counter() - start
+            timings[(workers, opencv_threads)] = len(items) / max(elapsed, 1e-9)
+    finally:
+        cv2.setNumThreads(previous_threads)
+
+    workers, opencv_threads = max(timings, key=timings.get)
+    best = ThreadBudget(cores, workers, opencv_threads)
+    logging.info(f"Autotuned thread budget: {best}")
+    return best, timings
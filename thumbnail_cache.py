@@ -0,0 +1,150 @@
+import os
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+
+import cv2
+from PIL import Image
+
+
+DEFAULT_THUMBNAIL_DIR = '.thumbnails'
+DEFAULT_MAX_DISK_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_MEMORY_ITEMS = 64
+
+
+class ThumbnailCache:
+    """Ready-to-display preview thumbnails cached in memory and on disk.
+
+    Thumbnails are keyed by source path, modification time, file size and the
+    target box, so an edited file gets a new thumbnail. The disk cache is
+    evicted least-recently-used first once it exceeds max_disk_bytes.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_THUMBNAIL_DIR, max_disk_bytes=DEFAULT_MAX_DISK_BYTES,
+                 max_memory_items=DEFAULT_MAX_MEMORY_ITEMS):
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.max_memory_items = max_memory_items
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.disk_bytes = sum(entry.stat().st_size for entry in os.scandir(self.cache_dir)
+                              if entry.is_file())
+
+    def _key(self, image_path, max_width, max_height):
+        stat = os.stat(image_path)
+        identity = f"{os.path.abspath(image_path)}|{stat.st_mtime_ns}|{stat.st_size}|{max_width}x{max_height}"
+        return hashlib.sha1(identity.encode('utf-8')).hexdigest()
+
+    def get(self, image_path, max_width=300, max_height=250):
+        """Return a PIL thumbnail of image_path fitting inside max_width x max_height."""
+        key = self._key(image_path, max_width, max_height)
+
+        with self._lock:
+            thumbnail = self._memory.get(key)
+            if thumbnail is not None:
+                self._memory.move_to_end(key)
+                return thumbnail
+
+        thumbnail_path = os.path.join(self.cache_dir, f"{key}.png")
+        if os.path.exists(thumbnail_path):
+            thumbnail = Image.open(thumbnail_path)
+            thumbnail.load()
+            # Touch so disk eviction sees it as recently used
+            os.utime(thumbnail_path)
+        else:
+            with Image.open(image_path) as img:
+                thumbnail = self.create_thumbnail(img, max_width, max_height)
+            self._write(thumbnail, thumbnail_path)
+
+        self._remember(key, thumbnail)
+        return thumbnail
+
+    def put(self, image_path, thumbnail, max_width=300, max_height=250):
+        """Store a thumbnail that was made without reading image_path, e.g. from_array."""
+        key = self._key(image_path, max_width, max_height)
+        self._write(thumbnail, os.path.join(self.cache_dir, f"{key}.png"))
+        self._remember(key, thumbnail)
+
+    @staticmethod
+    def from_array(image, max_width=300, max_height=250):
+        """Thumbnail of an in-memory BGR or grayscale uint8 array."""
+        img_height, img_width = image.shape[:2]
+        scale = min(max_width / img_width, max_height / img_height, 1.0)
+
+        new_width = max(int(img_width * scale), 1)
+        new_height = max(int(img_height * scale), 1)
+
+        # INTER_AREA averages source pixels, which suits large reductions
+        small = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+        return Image.fromarray(small)
+
+    @staticmethod
+    def create_thumbnail(img, max_width, max_height):
+        # JPEGs decode straight to the nearest DCT scale at or above the box size
+        img.draft(None, (max_width, max_height))
+
+        img_width, img_height = img.size
+        scale = min(max_width / img_width, max_height / img_height, 1.0)
+
+        new_width = max(int(img_width * scale), 1)
+        new_height = max(int(img_height * scale), 1)
+
+        if img.mode not in ('RGB', 'RGBA', 'L'):
+            img = img.convert('RGBA' if 'A' in img.getbands() else 'RGB')
+
+        return img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+
+    def _remember(self, key, thumbnail):
+        with self._lock:
+            self._memory[key] = thumbnail
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_items:
+                self._memory.popitem(last=False)
+
+    def _write(self, thumbnail, thumbnail_path):
+        # A rewritten key replaces its old file, whose bytes are already counted
+        try:
+            old_size = os.path.getsize(thumbnail_path)
+        except OSError:
+            old_size = 0
+
+        try:
+            thumbnail.save(thumbnail_path, format='PNG')
+            size = os.path.getsize(thumbnail_path)
+        except Exception as e:
+            logging.error(f"Error writing thumbnail {thumbnail_path}: {str(e)}")
+            return
+
+        with self._lock:
+            self.disk_bytes += size - old_size
+            if self.disk_bytes > self.max_disk_bytes:
+                self._evict_disk()
+
+    def _evict_disk(self):
+        # Oldest access first; a hit touches the file's mtime
+        entries = sorted((entry for entry in os.scandir(self.cache_dir) if entry.is_file()),
+                         key=lambda entry: entry.stat().st_mtime)
+
+        for entry in entries:
+            if self.disk_bytes <= self.max_disk_bytes:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self.disk_bytes -= size
+            except OSError as e:
+                logging.error(f"Error evicting thumbnail {entry.path}: {str(e)}")
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            for entry in os.scandir(self.cache_dir):
+                if entry.is_file():
+                    os.remove(entry.path)
+            self.disk_bytes = 0
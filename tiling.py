@@ -0,0 +1,81 @@
+import cv2
+import numpy as np
+
+
+DEFAULT_TILE_SIZE = 1024
+DEFAULT_TILE_OVERLAP = 16
+
+
+class Tile:
+    """One tile of a TileGrid: a core region plus a halo of overlapping pixels."""
+
+    def __init__(self, y0, y1, x0, x1, halo_y0, halo_y1, halo_x0, halo_x1):
+        self.y0, self.y1, self.x0, self.x1 = y0, y1, x0, x1
+        self.halo_y0, self.halo_y1 = halo_y0, halo_y1
+        self.halo_x0, self.halo_x1 = halo_x0, halo_x1
+
+    @property
+    def core(self):
+        return slice(self.y0, self.y1), slice(self.x0, self.x1)
+
+    @property
+    def halo(self):
+        return slice(self.halo_y0, self.halo_y1), slice(self.halo_x0, self.halo_x1)
+
+    def crop_core(self, halo_result):
+        """Cut the core region back out of a result computed over the halo."""
+        top = self.y0 - self.halo_y0
+        left = self.x0 - self.halo_x0
+        return halo_result[top:top + (self.y1 - self.y0), left:left + (self.x1 - self.x0)]
+
+
+class TileGrid:
+    """Split a height x width image into tiles of at most tile_size pixels a side."""
+
+    def __init__(self, height, width, tile_size=DEFAULT_TILE_SIZE, overlap=0):
+        if tile_size <= 0:
+            raise ValueError("tile_size must be positive")
+        if overlap < 0:
+            raise ValueError("overlap must not be negative")
+
+        self.height = height
+        self.width = width
+        self.tile_size = tile_size
+        self.overlap = overlap
+
+    def __iter__(self):
+        for y0 in range(0, self.height, self.tile_size):
+            y1 = min(y0 + self.tile_size, self.height)
+            for x0 in range(0, self.width, self.tile_size):
+                x1 = min(x0 + self.tile_size, self.width)
+                yield Tile(y0, y1, x0, x1,
+                           max(y0 - self.overlap, 0), min(y1 + self.overlap, self.height),
+                           max(x0 - self.overlap, 0), min(x1 + self.overlap, self.width))
+
+    def __len__(self):
+        rows = -(-self.height // self.tile_size)
+        cols = -(-self.width // self.tile_size)
+        return rows * cols
+
+
+def resize_region(src, full_width, full_height, y0, y1, x0, x1):
+    """Return rows y0:y1 and columns x0:x1 of src resized to full_width x full_height.
+
+    Only the requested region is produced, so resizing a small watermark up to
+    a gigapixel canvas never allocates the full-size result.
+    """
+    src_height, src_width = src.shape[:2]
+    if (src_width, src_height) == (full_width, full_height):
+        return src[y0:y1, x0:x1]
+
+    # Pixel centres map like cv2.resize (src = (dst + 0.5) * scale - 0.5), but warpAffine's
+    # fixed-point interpolation rounds differently, so values can differ from it by one level
+    scale_x = src_width / full_width
+    scale_y = src_height / full_height
+    matrix = np.float32([
+        [scale_x, 0, scale_x * (x0 + 0.5) - 0.5],
+        [0, scale_y, scale_y * (y0 + 0.5) - 0.5]
+    ])
+    return cv2.warpAffine(src, matrix, (x1 - x0, y1 - y0),
+                          flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP,
+                          borderMode=cv2.BORDER_REPLICATE)
@@ -2,226 +2,486 @@ import cv2
 import numpy as np
 from PIL import Image
 import os
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import threading
 
+from tiling import TileGrid, resize_region, DEFAULT_TILE_OVERLAP
+from image_cache import imread, draft_read_flags, ImageCache
+from image_writer import CachedResultsMixin
+from job_scheduler import JobCancelled
 
-class Watermarking:
+
+# Default Canny thresholds used for edge-based watermarking
+CANNY_LOW = 50
+CANNY_HIGH = 150
+
+# Memory budget for cached edge maps (single channel, one byte per pixel)
+EDGE_MAP_CACHE_BYTES = 256 * 1024 * 1024
+
+# Maximum per-pixel difference, in 8-bit levels, between the single-precision
+# real-FFT engine and a complex128 per-channel fft2/ifft2 reference
+FOURIER_TOLERANCE = 1
+
+# Engines for the Fourier embed/extract. The current scheme is linear, so
+# 'auto' resolves to 'spatial', which is within 1 level of the FFT result (they
+# differ where main + alpha * watermark lands on an integer); 'fft' is kept for
+# non-linear spectral schemes and 'verify' runs both and checks them against
+# FOURIER_TOLERANCE.
+FOURIER_ENGINES = ('auto', 'spatial', 'fft', 'verify')
+
+
+def rfft_channels(image):
+    """Real-input spectrum of every channel, as used by the Fourier watermark.
+    
+    Spectra use OpenCV's packed layout: the half spectrum stored as float32 in
+    an array of the image's own shape, so they add and scale like images.
+    """
+    # cv2.dft stays in float32, while np.fft.rfft2 works in float64 before NumPy 2.0
+    channels = cv2.split(image.astype(np.float32, copy=False))
+    return cv2.merge([cv2.dft(channel) for channel in channels])
+
+
+def irfft_channels(spectrum):
+    """Inverse of rfft_channels, as a float32 image."""
+    channels = cv2.split(spectrum)
+    return cv2.merge([cv2.idft(channel, flags=cv2.DFT_SCALE | cv2.DFT_REAL_OUTPUT)
+                      for channel in channels])
+
+
+def spatial_embed(main_img, watermark_img, alpha):
+    """main + alpha * watermark in float32, clipped and truncated to uint8 like the FFT path."""
+    # cv2.addWeighted would round instead, moving about 40% of pixels one level off the FFT result
+    watermarked = watermark_img.astype(np.float32)
+    watermarked *= np.float32(alpha)
+    watermarked += main_img
+    return np.clip(watermarked, 0, 255, out=watermarked).astype(np.uint8)
+
+
+_edge_map_cache = ImageCache(EDGE_MAP_CACHE_BYTES)
+
+
+def _cached_edge_mask(watermark_path, mtime_ns, width, height, low, high):
+    # mtime_ns is part of the cache key so an edited watermark file is re-read
+    key = (os.path.abspath(watermark_path), mtime_ns, width, height, low, high)
+    edges = _edge_map_cache.get(key)
+    if edges is not None:
+        return edges
     
-    def __init__(self):
-        self.supported_formats = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff']
+    watermark_img = imread(watermark_path)
+    if watermark_img is None:
+        raise ValueError(f"Could not load watermark image: {watermark_path}")
     
-    def visible_watermark(self, main_image_path, watermark_image_path, edge_opacity=50, output_path=None):
+    # Shared between callers, so the cache makes it read-only
+    edges = PreparedWatermark.compute_edge_mask(watermark_img, width, height, low, high)
+    _edge_map_cache.put(key, edges)
+    return edges
+
+
+class PreparedWatermark:
+    """Watermark whose edge maps are computed once per output size.
+    
+    Edge maps are cached single-channel under EDGE_MAP_CACHE_BYTES, least
+    recently used first out; the watermark file itself is decoded through the
+    shared image cache.
+    """
+    
+    def __init__(self, watermark_image_path, canny_low=CANNY_LOW, canny_high=CANNY_HIGH):
+        self.watermark_image_path = watermark_image_path
+        self.canny_low = canny_low
+        self.canny_high = canny_high
+    
+    @staticmethod
+    def compute_edge_mask(watermark_img, width, height, low=CANNY_LOW, high=CANNY_HIGH):
+        # Resize watermark to match main image dimensions
+        watermark_resized = cv2.resize(watermark_img, (width, height))
+        
+        # Convert to grayscale for edge detection
+        watermark_gray = cv2.cvtColor(watermark_resized, cv2.COLOR_BGR2GRAY)
+        
+        # Apply Canny edge detection
+        return cv2.Canny(watermark_gray, low, high)
+    
+    @staticmethod
+    def compute_edges(watermark_img, width, height, low=CANNY_LOW, high=CANNY_HIGH):
+        # Convert edges to 3-channel image
+        edges = PreparedWatermark.compute_edge_mask(watermark_img, width, height, low, high)
+        return cv2.cvtColor(edges, cv2.COLOR_GRAY2BGR)
+    
+    def edge_map(self, width, height):
+        """Return the 3-channel edge map for the given output size, built from the cached mask."""
+        mtime_ns = os.stat(self.watermark_image_path).st_mtime_ns
+        edges = _cached_edge_mask(self.watermark_image_path, mtime_ns, width, height,
+                                  self.canny_low, self.canny_high)
+        return cv2.cvtColor(edges, cv2.COLOR_GRAY2BGR)
+    
+    @staticmethod
+    def clear_cache():
+        _edge_map_cache.clear()
+
+
+class Watermarking(CachedResultsMixin):
+    
+    def __init__(self, fourier_engine='auto', tile_size=None, tile_overlap=DEFAULT_TILE_OVERLAP,
+                 draft_scale=1, cache_results=True, codecs=None, writer=None):
+        super().__init__(cache_results, codecs, writer)
+        
+        if fourier_engine not in FOURIER_ENGINES:
+            raise ValueError(f"fourier_engine must be one of {FOURIER_ENGINES}")
+        self.fourier_engine = fourier_engine
+        
+        # Tiled mode keeps working buffers bounded by the tile size; tile_overlap
+        # is the halo given to neighbourhood operations such as Canny
+        self.tile_size = tile_size
+        self.tile_overlap = tile_overlap
+        
+        # Draft mode decodes inputs at 1/2, 1/4 or 1/8 scale for previews and tuning
+        self.draft_scale = draft_scale
+        self.read_flags = draft_read_flags(draft_scale)
+    
+    def visible_watermark(self, main_image_path, watermark_image_path, edge_opacity=50, output_path=None,
+                          on_result=None):
 
         try:
-            # Load images
-            main_img = cv2.imread(main_image_path)
-            watermark_img = cv2.imread(watermark_image_path)
-            
-            if main_img is None or watermark_img is None:
-                raise ValueError("Could not load one or both images")
-            
-            # Resize watermark to match main image dimensions
-            watermark_resized = cv2.resize(watermark_img, (main_img.shape[1], main_img.shape[0]))
-            
-            # Convert to grayscale for edge detection
-            watermark_gray = cv2.cvtColor(watermark_resized, cv2.COLOR_BGR2GRAY)
-            
-            # Apply Canny edge detection
-            edges = cv2.Canny(watermark_gray, 50, 150)
-            
-            # Convert edges to 3-channel image
-            edges_3channel = cv2.cvtColor(edges, cv2.COLOR_GRAY2BGR)
+            # Accept a PreparedWatermark so batches can share one instance
+            if isinstance(watermark_image_path, PreparedWatermark):
+                prepared = watermark_image_path
+            else:
+                prepared = PreparedWatermark(watermark_image_path)
             
-            # Normalize opacity (0-100 to 0-1)
-            alpha = edge_opacity / 100.0
+            default_prefix = "watermarked_images/visible_watermark"
+            key = self.result_key('visible', [main_image_path, prepared.watermark_image_path],
+                                   edge_opacity=edge_opacity, canny_low=prepared.canny_low,
+                                   canny_high=prepared.canny_high)
+            cached_path = self.cached_result(output_path, default_prefix, key, 'visible')
+            if cached_path:
+                return cached_path
             
-            # Apply watermark using cv2.addWeighted
-            watermarked = cv2.addWeighted(main_img, 1.0, edges_3channel, alpha, 0)
+            # Load main image
+            main_img = imread(main_image_path, self.read_flags)
             
-            # Generate output path if not provided
-            if output_path is None:
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                output_path = f"watermarked_images/visible_watermark_{timestamp}.jpg"
+            if main_img is None or not os.path.exists(prepared.watermark_image_path):
+                raise ValueError("Could not load one or both images")
             
-            # Save the result
-            cv2.imwrite(output_path, watermarked)
+            watermarked = self.visible_watermark_array(main_img, prepared, edge_opacity)
             
-            return output_path
+            return self.save_result(watermarked, output_path, default_prefix, on_result, key, 'visible')
             
+        except JobCancelled:
+            # Raised by on_result for a cancelled job, which is not an error
+            raise
         except Exception as e:
             print(f"Error in visible watermarking: {str(e)}")
             return None
     
-    def invisible_watermark(self, main_image_path, watermark_image_path, alpha=0.1, output_path=None):
+    def visible_watermark_array(self, main_img, watermark_img, edge_opacity=50):
+        """In-memory visible watermarking; watermark_img is a BGR array or a PreparedWatermark."""
+        height, width = main_img.shape[:2]
+        
+        # Normalize opacity (0-100 to 0-1)
+        alpha = edge_opacity / 100.0
+        
+        canny_low, canny_high = CANNY_LOW, CANNY_HIGH
+        if isinstance(watermark_img, PreparedWatermark):
+            canny_low, canny_high = watermark_img.canny_low, watermark_img.canny_high
+            
+            if not self.tile_size:
+                # Edge map is computed once per watermark file and output size
+                edges_3channel = watermark_img.edge_map(width, height)
+                return cv2.addWeighted(main_img, 1.0, edges_3channel, alpha, 0)
+            
+            watermark_img = imread(watermark_img.watermark_image_path, self.read_flags)
+            if watermark_img is None:
+                raise ValueError("Could not load watermark image")
+        
+        if self.tile_size:
+            return self._visible_tiled(main_img, watermark_img, alpha, canny_low, canny_high)
+        
+        edges_3channel = PreparedWatermark.compute_edges(watermark_img, width, height, canny_low, canny_high)
+        
+        # Apply watermark using cv2.addWeighted
+        return cv2.addWeighted(main_img, 1.0, edges_3channel, alpha, 0)
+    
+    def invisible_watermark(self, main_image_path, watermark_image_path, alpha=0.1, output_path=None,
+                            on_result=None):
 
         try:
+            default_prefix = "watermarked_images/invisible_watermark"
+            key = self.result_key('invisible', [main_image_path, watermark_image_path], alpha=alpha)
+            cached_path = self.cached_result(output_path, default_prefix, key, 'invisible')
+            if cached_path:
+                return cached_path
+            
             # Load images
-            main_img = cv2.imread(main_image_path)
-            watermark_img = cv2.imread(watermark_image_path)
+            main_img = imread(main_image_path, self.read_flags)
+            watermark_img = imread(watermark_image_path, self.read_flags)
             
             if main_img is None or watermark_img is None:
                 raise ValueError("Could not load one or both images")
             
-            # Resize watermark to match main image dimensions
-            watermark_resized = cv2.resize(watermark_img, (main_img.shape[1], main_img.shape[0]))
-            
-            # Convert to float32 for FFT
-            main_float = main_img.astype(np.float32)
-            watermark_float = watermark_resized.astype(np.float32)
+            watermarked = self.invisible_watermark_array(main_img, watermark_img, alpha)
             
-            # Split channels
-            main_b, main_g, main_r = cv2.split(main_float)
-            watermark_b, watermark_g, watermark_r = cv2.split(watermark_float)
-            
-            # Apply FFT to each channel
-            main_b_fft = np.fft.fft2(main_b)
-            main_g_fft = np.fft.fft2(main_g)
-            main_r_fft = np.fft.fft2(main_r)
-            
-            watermark_b_fft = np.fft.fft2(watermark_b)
-            watermark_g_fft = np.fft.fft2(watermark_g)
-            watermark_r_fft = np.fft.fft2(watermark_r)
-            
-            # Embed watermark in frequency domain
-            watermarked_b_fft = main_b_fft + alpha * watermark_b_fft
-            watermarked_g_fft = main_g_fft + alpha * watermark_g_fft
-            watermarked_r_fft = main_r_fft + alpha * watermark_r_fft
-            
-            # Apply inverse FFT
-            watermarked_b = np.real(np.fft.ifft2(watermarked_b_fft))
-            watermarked_g = np.real(np.fft.ifft2(watermarked_g_fft))
-            watermarked_r = np.real(np.fft.ifft2(watermarked_r_fft))
-            
-            # Merge channels
-            watermarked = cv2.merge([watermarked_b, watermarked_g, watermarked_r])
-            
-            # Clip values to valid range and convert back to uint8
-            watermarked = np.clip(watermarked, 0, 255).astype(np.uint8)
-            
-            # Generate output path if not provided
-            if output_path is None:
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                output_path = f"watermarked_images/invisible_watermark_{timestamp}.jpg"
-            
-            # Save the result
-            cv2.imwrite(output_path, watermarked)
-            
-            return output_path
+            return self.save_result(watermarked, output_path, default_prefix, on_result, key, 'invisible')
             
+        except JobCancelled:
+            raise
         except Exception as e:
             print(f"Error in invisible watermarking: {str(e)}")
             return None
     
-    def extract_watermark(self, original_image_path, watermarked_image_path, method='fourier', output_path=None):
+    def invisible_watermark_array(self, main_img, watermark_img, alpha=0.1):
+        """In-memory invisible watermarking of BGR uint8 arrays."""
+        if self.tile_size:
+            return self._invisible_tiled(main_img, watermark_img, alpha)
+        
+        # Resize watermark to match main image dimensions
+        watermark_resized = cv2.resize(watermark_img, (main_img.shape[1], main_img.shape[0]))
+        
+        # Embed watermark in frequency domain
+        return self._fourier_embed(main_img, watermark_resized, alpha)
+    
+    def output_settings(self):
+        # Engine settings change the output, so they are part of the result key
+        return {'fourier_engine': self.fourier_engine, 'tile_size': self.tile_size,
+                'tile_overlap': self.tile_overlap, 'draft_scale': self.draft_scale}
+    
+    def _visible_tiled(self, main_img, watermark_img, alpha, canny_low, canny_high):
+        height, width = main_img.shape[:2]
+        watermarked = np.empty_like(main_img)
+        
+        for tile in TileGrid(height, width, self.tile_size, self.tile_overlap):
+            # Canny needs neighbouring pixels, so edges are found over the halo
+            watermark_tile = resize_region(watermark_img, width, height,
+                                           tile.halo_y0, tile.halo_y1, tile.halo_x0, tile.halo_x1)
+            watermark_gray = cv2.cvtColor(watermark_tile, cv2.COLOR_BGR2GRAY)
+            edges = tile.crop_core(cv2.Canny(watermark_gray, canny_low, canny_high))
+            edges_3channel = cv2.cvtColor(np.ascontiguousarray(edges), cv2.COLOR_GRAY2BGR)
+            
+            watermarked[tile.core] = cv2.addWeighted(main_img[tile.core], 1.0, edges_3channel, alpha, 0)
+        
+        return watermarked
+    
+    def _invisible_tiled(self, main_img, watermark_img, alpha):
+        # A global FFT cannot be split into tiles; the pixel-space form is exact per tile
+        if self.fourier_engine not in ('auto', 'spatial'):
+            raise ValueError("Tiled mode requires the 'auto' or 'spatial' Fourier engine")
+        
+        height, width = main_img.shape[:2]
+        watermarked = np.empty_like(main_img)
+        
+        # Embedding is per pixel, so tiles need no halo
+        for tile in TileGrid(height, width, self.tile_size):
+            watermark_tile = resize_region(watermark_img, width, height,
+                                           tile.y0, tile.y1, tile.x0, tile.x1)
+            watermarked[tile.core] = self._fourier_embed(main_img[tile.core], watermark_tile, alpha)
+        
+        return watermarked
+    
+    def _fourier_embed(self, main_img, watermark_img, alpha):
+        # IFFT(FFT(main) + alpha * FFT(watermark)) == main + alpha * watermark
+        return self._run_fourier_engine(
+            lambda: spatial_embed(main_img, watermark_img, alpha),
+            lambda: self._fft_embed(main_img, watermark_img, alpha)
+        )
+    
+    def _fourier_difference(self, original, watermarked, original_fft=None):
+        # IFFT(FFT(watermarked) - FFT(original)) == watermarked - original
+        return self._run_fourier_engine(
+            lambda: cv2.subtract(watermarked, original),
+            lambda: self._fft_difference(original, watermarked, original_fft)
+        )
+    
+    def _run_fourier_engine(self, spatial_op, fft_op):
+        if self.fourier_engine in ('auto', 'spatial'):
+            return spatial_op()
+        if self.fourier_engine == 'fft':
+            return fft_op()
+        
+        # Verify mode: the spatial result must match the FFT path
+        spatial_result = spatial_op()
+        fft_result = fft_op()
+        max_diff = int(cv2.absdiff(spatial_result, fft_result).max())
+        if max_diff > FOURIER_TOLERANCE:
+            raise ValueError(f"Spatial and FFT engines differ by {max_diff} levels "
+                             f"(tolerance {FOURIER_TOLERANCE})")
+        return spatial_result
+    
+    def _fft_embed(self, main_img, watermark_img, alpha):
+        main_fft = rfft_channels(main_img)
+        watermark_fft = rfft_channels(watermark_img)
+        
+        # main_fft + alpha * watermark_fft, computed in place to limit peak memory
+        watermark_fft *= np.float32(alpha)
+        main_fft += watermark_fft
+        del watermark_fft
+        
+        watermarked = irfft_channels(main_fft)
+        
+        # Clip values to valid range and convert back to uint8
+        return np.clip(watermarked, 0, 255).astype(np.uint8)
+    
+    def _fft_difference(self, original, watermarked, original_fft=None):
+        if original_fft is None:
+            original_fft = rfft_channels(original)
+        
+        water_fft = rfft_channels(watermarked)
+        water_fft -= original_fft
+        
+        extracted = irfft_channels(water_fft)
+        
+        # Normalize and convert to uint8
+        return np.clip(extracted, 0, 255).astype(np.uint8)
+    
+    def extract_watermark(self, original_image_path, watermarked_image_path, method='fourier', output_path=None,
+                          on_result=None):
 
         try:
+            if method not in ('fourier', 'edge'):
+                raise ValueError("Method must be 'fourier' or 'edge'")
+            
+            default_prefix = f"results/extracted_watermark_{method}"
+            key = self.result_key(f'extract_{method}', [original_image_path, watermarked_image_path])
+            cached_path = self.cached_result(output_path, default_prefix, key, f'extract_{method}')
+            if cached_path:
+                return cached_path
+            
             if method == 'fourier':
-                return self._extract_fourier_watermark(original_image_path, watermarked_image_path, output_path)
-            elif method == 'edge':
-                return self._extract_edge_watermark(original_image_path, watermarked_image_path, output_path)
+                return self._extract_fourier_watermark(original_image_path, watermarked_image_path, output_path, on_result, key)
             else:
-                raise ValueError("Method must be 'fourier' or 'edge'")
+                return self._extract_edge_watermark(original_image_path, watermarked_image_path, output_path, on_result, key)
                 
+        except JobCancelled:
+            raise
         except Exception as e:
             print(f"Error in watermark extraction: {str(e)}")
             return None
     
-    def _extract_fourier_watermark(self, original_path, watermarked_path, output_path):
+    def extract_watermark_array(self, original, watermarked, method='fourier'):
+        """In-memory watermark extraction from BGR uint8 arrays."""
+        if method == 'fourier':
+            # Extract watermark (difference in frequency domain)
+            return self._fourier_difference(original, watermarked)
+        elif method == 'edge':
+            return self._edge_difference(original, watermarked)
+        else:
+            raise ValueError("Method must be 'fourier' or 'edge'")
+    
+    def _extract_fourier_watermark(self, original_path, watermarked_path, output_path, on_result=None, key=None):
        
         # Load images
-        original = cv2.imread(original_path)
-        watermarked = cv2.imread(watermarked_path)
+        original = imread(original_path, self.read_flags)
+        watermarked = imread(watermarked_path, self.read_flags)
         
         if original is None or watermarked is None:
             raise ValueError("Could not load images")
         
-        # Convert to float32
-        orig_float = original.astype(np.float32)
-        water_float = watermarked.astype(np.float32)
-        
-        # Split channels
-        orig_b, orig_g, orig_r = cv2.split(orig_float)
-        water_b, water_g, water_r = cv2.split(water_float)
-        
-        # Apply FFT
-        orig_b_fft = np.fft.fft2(orig_b)
-        orig_g_fft = np.fft.fft2(orig_g)
-        orig_r_fft = np.fft.fft2(orig_r)
-        
-        water_b_fft = np.fft.fft2(water_b)
-        water_g_fft = np.fft.fft2(water_g)
-        water_r_fft = np.fft.fft2(water_r)
-        
-        # Extract watermark (difference in frequency domain)
-        extracted_b_fft = water_b_fft - orig_b_fft
-        extracted_g_fft = water_g_fft - orig_g_fft
-        extracted_r_fft = water_r_fft - orig_r_fft
-        
-        # Apply inverse FFT
-        extracted_b = np.real(np.fft.ifft2(extracted_b_fft))
-        extracted_g = np.real(np.fft.ifft2(extracted_g_fft))
-        extracted_r = np.real(np.fft.ifft2(extracted_r_fft))
+        extracted = self.extract_watermark_array(original, watermarked, 'fourier')
         
-        # Merge channels
-        extracted = cv2.merge([extracted_b, extracted_g, extracted_r])
-        
-        # Normalize and convert to uint8
-        extracted = np.clip(extracted, 0, 255).astype(np.uint8)
-        
-        # Generate output path if not provided
-        if output_path is None:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            output_path = f"results/extracted_watermark_fourier_{timestamp}.jpg"
-        
-        # Save the result
-        cv2.imwrite(output_path, extracted)
-        
-        return output_path
+        return self.save_result(extracted, output_path, "results/extracted_watermark_fourier", on_result, key,
+                                 'extract_fourier')
     
-    def _extract_edge_watermark(self, original_path, watermarked_path, output_path):
+    def _extract_edge_watermark(self, original_path, watermarked_path, output_path, on_result=None, key=None):
         
         # Load images
-        original = cv2.imread(original_path)
-        watermarked = cv2.imread(watermarked_path)
+        original = imread(original_path, self.read_flags)
+        watermarked = imread(watermarked_path, self.read_flags)
         
         if original is None or watermarked is None:
             raise ValueError("Could not load images")
         
+        extracted_edges = self.extract_watermark_array(original, watermarked, 'edge')
+        
+        return self.save_result(extracted_edges, output_path, "results/extracted_watermark_edge", on_result, key,
+                                 'extract_edge')
+    
+    def _edge_difference(self, original, watermarked):
         # Convert to grayscale
         orig_gray = cv2.cvtColor(original, cv2.COLOR_BGR2GRAY)
         water_gray = cv2.cvtColor(watermarked, cv2.COLOR_BGR2GRAY)
         
         # Apply Canny edge detection
-        orig_edges = cv2.Canny(orig_gray, 50, 150)
-        water_edges = cv2.Canny(water_gray, 50, 150)
+        orig_edges = cv2.Canny(orig_gray, CANNY_LOW, CANNY_HIGH)
+        water_edges = cv2.Canny(water_gray, CANNY_LOW, CANNY_HIGH)
         
         # Extract difference (watermark edges)
-        extracted_edges = cv2.subtract(water_edges, orig_edges)
+        return cv2.subtract(water_edges, orig_edges)
+
+
+class FourierExtractor:
+    """Fourier watermark extraction of many candidates against one original.
+    
+    The original is decoded once (or passed in already decoded), and its
+    spectrum is computed at most once (only when the Watermarking engine
+    actually uses the FFT path).
+    """
+    
+    def __init__(self, original_image_path, watermarking=None, original=None):
+        self.watermarking = watermarking if watermarking is not None else Watermarking()
+        self.original_image_path = original_image_path
         
-        # Generate output path if not provided
-        if output_path is None:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            output_path = f"results/extracted_watermark_edge_{timestamp}.jpg"
+        self.original = original if original is not None else imread(original_image_path,
+                                                                     self.watermarking.read_flags)
+        if self.original is None:
+            raise ValueError(f"Could not load original image: {original_image_path}")
         
-        # Save the result
-        cv2.imwrite(output_path, extracted_edges)
+        # Shared by worker threads, so it must never be modified in place
+        self.original.setflags(write=False)
         
-        return output_path
+        self._original_fft = None
+        self._lock = threading.Lock()
     
-    def validate_image(self, image_path):
-        if not os.path.exists(image_path):
-            return False, "File does not exist"
+    def _spectrum(self):
+        with self._lock:
+            if self._original_fft is None:
+                self._original_fft = rfft_channels(self.original)
+            return self._original_fft
+    
+    def extract_array(self, watermarked):
+        """Extract the watermark from an in-memory candidate image."""
+        if watermarked.shape != self.original.shape:
+            raise ValueError("Watermarked image size does not match the original")
         
-        # Check file extension
-        _, ext = os.path.splitext(image_path.lower())
-        if ext not in self.supported_formats:
-            return False, f"Unsupported format. Supported: {self.supported_formats}"
+        original_fft = None
+        if self.watermarking.fourier_engine in ('fft', 'verify'):
+            original_fft = self._spectrum()
         
-        # Try to load the image
+        return self.watermarking._fourier_difference(self.original, watermarked, original_fft)
+    
+    def extract(self, watermarked_image_path, output_path=None):
         try:
-            img = cv2.imread(image_path)
-            if img is None:
-                return False, "Could not load image"
-            return True, "Valid image"
+            default_prefix = None
+            key = None
+            if output_path is None:
+                # Candidate name keeps outputs readable; the key keeps them unique
+                name = os.path.splitext(os.path.basename(watermarked_image_path))[0]
+                default_prefix = f"results/extracted_watermark_fourier_{name}"
+                key = self.watermarking.result_key('extract_fourier',
+                                                    [self.original_image_path, watermarked_image_path])
+                cached_path = self.watermarking.cached_result(output_path, default_prefix, key,
+                                                               'extract_fourier')
+                if cached_path:
+                    return cached_path
+            
+            watermarked = imread(watermarked_image_path, self.watermarking.read_flags)
+            if watermarked is None:
+                raise ValueError("Could not load images")
+            
+            extracted = self.extract_array(watermarked)
+            
+            return self.watermarking.save_result(extracted, output_path, default_prefix, key=key,
+                                                  operation='extract_fourier')
+            
+        except JobCancelled:
+            raise
         except Exception as e:
-            return False, f"Error loading image: {str(e)}"
\ No newline at end of file
+            print(f"Error in watermark extraction: {str(e)}")
+            return None
+    
+    def extract_many(self, watermarked_image_paths, output_paths=None, max_workers=None):
+        """Extract from many candidates in a thread pool; returns paths in input order."""
+        watermarked_image_paths = list(watermarked_image_paths)
+        if output_paths is None:
+            output_paths = [None] * len(watermarked_image_paths)
+        
+        # OpenCV and NumPy FFTs release the GIL, so the heavy parts of extractions run in parallel
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(self.extract, watermarked_image_paths, output_paths))